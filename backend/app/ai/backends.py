@@ -0,0 +1,251 @@
+# Chat completion backends the provider routes tasks to
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from openai import AsyncOpenAI, OpenAI
+from pydantic import BaseModel
+
+from app.metrics import CallbackMetric
+from .offline import fake_structured, fake_text, message_seed
+from .resilience import CircuitBreaker, RateLimiter, circuit_breaker, rate_limiter
+
+# OpenAI-compatible server for the 'local' backend, e.g. vLLM, llama.cpp or Ollama
+AI_LOCAL_BASE_URL = os.getenv("AI_LOCAL_BASE_URL", "http://localhost:8080/v1")
+AI_LOCAL_API_KEY = os.getenv("AI_LOCAL_API_KEY", "local")
+
+
+@dataclass
+class Completion:
+    """
+    Result of one completion.
+    Args:
+        result (str | dict | None): Text, the structured output as a dict, or
+            None when the model gave no structured output (a refusal).
+        usage: The API's usage object, if the backend reports one.
+    """
+
+    result: str | dict | None
+    usage: Any = None
+
+
+class TextStream:
+    """Text deltas of a streaming completion; usage is set once it is exhausted."""
+
+    usage: Any = None
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class Backend:
+    """
+    Interface of a chat completions backend.
+    Each backend has its own circuit breaker, and optionally a rate limiter
+    for the quota of the account it calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+    ):
+        self.name = name
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def complete(
+        self,
+        model: str,
+        messages: list[dict],
+        structured_output: type[BaseModel] | None,
+        max_output_tokens: int | None,
+    ) -> Completion:
+        raise NotImplementedError
+
+    async def complete_async(
+        self,
+        model: str,
+        messages: list[dict],
+        structured_output: type[BaseModel] | None,
+        max_output_tokens: int | None,
+    ) -> Completion:
+        raise NotImplementedError
+
+    async def open_stream(
+        self, model: str, messages: list[dict], max_output_tokens: int | None
+    ) -> TextStream:
+        raise NotImplementedError
+
+
+class OpenAIBackend(Backend):
+    """
+    The OpenAI API, or any server implementing its chat completions endpoint.
+    The SDK's own retries are disabled, the provider retries behind the
+    rate limiter and circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str | None = None,
+        api_key: str | None = None,
+        rate_limiter: RateLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+    ):
+        super().__init__(name, rate_limiter, circuit_breaker)
+        self.client = OpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+        self.async_client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+    def complete(self, model, messages, structured_output, max_output_tokens):
+        if structured_output:
+            response = self.client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=structured_output,
+                max_completion_tokens=max_output_tokens,
+            )
+        else:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_completion_tokens=max_output_tokens,
+            )
+        return self._completion(response, structured_output)
+
+    async def complete_async(self, model, messages, structured_output, max_output_tokens):
+        if structured_output:
+            response = await self.async_client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=structured_output,
+                max_completion_tokens=max_output_tokens,
+            )
+        else:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_completion_tokens=max_output_tokens,
+            )
+        return self._completion(response, structured_output)
+
+    async def open_stream(self, model, messages, max_output_tokens):
+        stream = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_output_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        return _OpenAITextStream(stream)
+
+    def _completion(self, response, structured_output) -> Completion:
+        message = response.choices[0].message
+        if structured_output:
+            result = message.parsed.model_dump() if message.parsed else None
+        else:
+            result = message.content
+        return Completion(result, getattr(response, "usage", None))
+
+
+class _OpenAITextStream(TextStream):
+    def __init__(self, stream):
+        self._stream = stream
+        self.usage = None
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if chunk.usage is not None:
+                self.usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class OfflineBackend(Backend):
+    """
+    Deterministic answers without any API: schema-valid structured output
+    and a fixed text reply. For development, demos and tests without a key.
+    """
+
+    def complete(self, model, messages, structured_output, max_output_tokens):
+        seed = message_seed(messages)
+        if structured_output:
+            return Completion(fake_structured(structured_output, seed))
+        return Completion(fake_text(seed))
+
+    async def complete_async(self, model, messages, structured_output, max_output_tokens):
+        return self.complete(model, messages, structured_output, max_output_tokens)
+
+    async def open_stream(self, model, messages, max_output_tokens):
+        return _OfflineTextStream(fake_text(message_seed(messages)))
+
+
+class _OfflineTextStream(TextStream):
+    def __init__(self, text: str):
+        self._text = text
+
+    async def __aiter__(self):
+        for i, word in enumerate(self._text.split(" ")):
+            yield word if i == 0 else f" {word}"
+
+
+def _create_backend(name: str) -> Backend:
+    if name == "openai":
+        # OPENAI_API_KEY and OPENAI_BASE_URL are read by the SDK
+        return OpenAIBackend(
+            name, rate_limiter=rate_limiter, circuit_breaker=circuit_breaker
+        )
+    if name == "local":
+        return OpenAIBackend(name, base_url=AI_LOCAL_BASE_URL, api_key=AI_LOCAL_API_KEY)
+    if name == "offline":
+        return OfflineBackend(name)
+    raise ValueError(f"Unknown AI backend: {name}")
+
+
+_backends: dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend):
+    """Make a backend available to routes under its name, replacing any other."""
+    _backends[backend.name] = backend
+
+
+def get_backend(name: str) -> Backend:
+    """
+    The backend routes refer to by name. Built-in backends ('openai', 'local',
+    'offline') are created on first use, so unused ones need no configuration.
+    """
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = _create_backend(name)
+    return backend
+
+
+CallbackMetric(
+    "ai_circuit_breaker_open",
+    "1 while a backend's circuit breaker fails calls fast, 0.5 during the trial call",
+    ("backend",),
+    lambda: {
+        (name,): {"closed": 0, "half_open": 0.5, "open": 1}[b.circuit_breaker.state]
+        for name, b in list(_backends.items())
+    },
+)
+CallbackMetric(
+    "ai_circuit_breaker_rejected_total",
+    "LLM calls failed fast by an open circuit breaker",
+    ("backend",),
+    lambda: {(name,): b.circuit_breaker.rejected for name, b in list(_backends.items())},
+    type_="counter",
+)
+CallbackMetric(
+    "ai_rate_limited_total",
+    "LLM calls delayed by a backend's client-side rate limiter",
+    ("backend",),
+    lambda: {
+        (name,): b.rate_limiter.throttled
+        for name, b in list(_backends.items())
+        if b.rate_limiter is not None
+    },
+    type_="counter",
+)
@@ -0,0 +1,175 @@
+# Content-addressed cache for LLM responses
+import copy
+import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.db.queries import get_llm_cache_entry, save_llm_cache_entry
+from app.metrics import CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Two-tier cache for completion results.
+    The memory tier is an LRU bounded by entry count and approximate size in
+    bytes; the persistent tier is the llm_cache table, so identical uploads
+    stay cheap across restarts. Both tiers expire entries after a TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: int = 7 * 24 * 3600,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, size, value), ordered from least to most recent
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        task: str, model: str, system_prompt: str, user_prompt: str, schema=None
+    ) -> str:
+        """
+        Hashes everything that determines a completion into a cache key.
+        Args:
+            task (str): Task name
+            model (str): Model identifier
+            system_prompt (str): Final system prompt
+            user_prompt (str): Final user prompt
+            schema (type[BaseModel] | None): Structured output schema, if any
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        payload = json.dumps(
+            [
+                task,
+                model,
+                system_prompt,
+                user_prompt,
+                schema.model_json_schema() if schema else None,
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        """Looks up a key in the memory tier only."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Callers get their own copy so cached results can't be mutated
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, expires_at: float | None = None):
+        """Stores a value in the memory tier, evicting least recently used entries."""
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at or time.time() + self.ttl_seconds, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def get_async(self, key: str) -> Any | None:
+        """Looks up a key in memory, falling back to the persistent tier."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        try:
+            entry = await get_llm_cache_entry(key)
+        except Exception as e:
+            logger.warning("Error reading LLM cache: %s", e)
+            return None
+        if entry is None:
+            return None
+
+        # A persistent hit replaces the miss counted by the memory tier
+        self.misses -= 1
+        self.persistent_hits += 1
+        expires_at = entry.expires_at.replace(tzinfo=datetime.timezone.utc)
+        self.set(key, entry.response, expires_at=expires_at.timestamp())
+        return entry.response
+
+    async def set_async(self, key: str, task: str, value: Any):
+        """Stores a value in both tiers."""
+        self.set(key, value)
+        # The persistent tier stores naive UTC timestamps
+        expires_at = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        ) + datetime.timedelta(seconds=self.ttl_seconds)
+        try:
+            await save_llm_cache_entry(key, task, value, expires_at)
+        except Exception as e:
+            logger.warning("Error writing LLM cache: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+# Shared by every AIProvider instance in the process
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("AI_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+)
+
+CallbackMetric(
+    "ai_cache_lookups_total",
+    "LLM response cache lookups by result",
+    ("result",),
+    lambda: {
+        (result,): response_cache.stats()[result]
+        for result in ("hits", "persistent_hits", "misses")
+    },
+    type_="counter",
+)
+CallbackMetric(
+    "ai_cache_bytes",
+    "Approximate size of the in-memory LLM response cache",
+    (),
+    lambda: {(): response_cache.stats()["bytes"]},
+)
@@ -0,0 +1,87 @@
+# Deterministic stand-in completions, for the offline backend and the fake API in bench/
+import hashlib
+import json
+
+from pydantic import BaseModel
+
+
+class SchemaFaker:
+    """
+    Builds a deterministic instance of a JSON schema. Values depend only on
+    the seed, so identical prompts get identical answers, and every task's
+    output schema is covered without knowing the task.
+    """
+
+    def __init__(self, schema: dict, seed: str, items: int = 3):
+        self.defs = schema.get("$defs", {})
+        self.seed = seed
+        self.items = items
+
+    def make(self, schema: dict, path: str = "root"):
+        if "$ref" in schema:
+            return self.make(self.defs[schema["$ref"].split("/")[-1]], path)
+        for key in ("anyOf", "oneOf", "allOf"):
+            if key in schema:
+                options = [s for s in schema[key] if s.get("type") != "null"]
+                return self.make(options[0], path) if options else None
+        if "enum" in schema:
+            return schema["enum"][self._number(path) % len(schema["enum"])]
+        if "const" in schema:
+            return schema["const"]
+
+        type_ = schema.get("type")
+        if isinstance(type_, list):
+            type_ = next((t for t in type_ if t != "null"), "null")
+        if type_ == "object":
+            return {
+                name: self.make(prop, f"{path}.{name}")
+                for name, prop in schema.get("properties", {}).items()
+            }
+        if type_ == "array":
+            count = max(schema.get("minItems", self.items), 1)
+            count = min(count, schema.get("maxItems", count))
+            return [
+                self.make(schema.get("items", {}), f"{path}[{i}]") for i in range(count)
+            ]
+        if type_ == "integer":
+            return self._number(path) % 100
+        if type_ == "number":
+            # Scores and similar ratios: stay within any declared bounds
+            low = schema.get("minimum", 0)
+            high = schema.get("maximum", 100)
+            return low + (self._number(path) % 1000) / 1000 * (high - low)
+        if type_ == "boolean":
+            return self._number(path) % 2 == 0
+        if type_ == "null":
+            return None
+        return self._text(path)
+
+    def _number(self, path: str) -> int:
+        digest = hashlib.sha256(f"{self.seed}:{path}".encode()).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def _text(self, path: str) -> str:
+        # Distinct words per path, so duplicate filters keep every item
+        field = path.rsplit(".", 1)[-1]
+        words = [f"w{(self._number(f'{path}:{i}') % 9973)}" for i in range(8)]
+        return f"{field} {' '.join(words)}"
+
+
+def message_seed(messages: list[dict]) -> str:
+    """Stable seed for a conversation, so answers repeat for repeated prompts."""
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+
+def fake_structured(output: type[BaseModel], seed: str, items: int = 3) -> dict:
+    """A valid instance of a structured output model."""
+    schema = output.model_json_schema()
+    return output.model_validate(SchemaFaker(schema, seed, items).make(schema)).model_dump()
+
+
+def fake_text(seed: str) -> str:
+    """A plain-text answer for chat and other text tasks."""
+    return (
+        f"Here is a short explanation based on the document ({seed[:8]}). "
+        "The key idea is covered in the first section; review it and try the "
+        "question again."
+    )
@@ -19,8 +19,17 @@ class Prompts:
     The questions should be clear, concise, and relevant to the content.
     """
 
+    # System prompt for MCQ generation with precomputed feedback for every option
+    # Format: Input -> Content text, Output -> {questions: List[{question: str, distractors: List[str],
+    # correct_answer: str, explanation: str, distractor_explanations: List[str]}]}
+    MCQ_EXPLAINED_SYSTEM = MCQ_SYSTEM + """For each question, also write a brief explanation of why the correct answer is correct.
+    Then, for each option in distractors, in the same order, write a brief explanation of why a student choosing it is wrong.
+    Use an empty string for the correct answer. Keep each explanation concise, ideally around 30-50 words.
+    """
+
     # System prompt for essay grading with weighted scoring criteria
     # Format: Input -> {prompt: str, content: str, expected_answer: str, essay: str}
+    # content holds the document passages most relevant to the prompt and essay
     # Output -> {score: float, feedback: List[str]}
     GRADE_ESSAY_SYSTEM = """You are an experienced essay grader who provides detailed feedback and scoring.
     First, read the essay prompt caarefully and understand the expected answer.
@@ -39,7 +48,7 @@ class Prompts:
     The feedback should be concise, ideally around 200-300 words.
 
     Prompt: {prompt}
-    Content: {content}
+    Content (relevant excerpts): {content}
     Expected Answer: {expected_answer}
     """
 
@@ -58,6 +67,8 @@ class Prompts:
     """
 
     # Chat tutor prompts
+    # Format: Input -> {assessment: dict, overview: str, passages: str, summary: str}, Output -> plain text response
+    # The latest turns follow the system prompt as messages; summary covers the older ones
     CHAT_SYSTEM = """You are a knowledgeable tutor who helps students understand concepts better.
     Your task is to provide clear, concise, and informative responses to student questions.
     When a student asks a question, first understand the context and the specific concept they are struggling with.
@@ -68,6 +79,15 @@ class Prompts:
 
     These are assessment details:
     Assessment: {assessment}
+
+    This is an overview of the whole study document:
+    {overview}
+
+    These are the passages of the study document most relevant to the question:
+    {passages}
+
+    This is a summary of the earlier conversation with the student:
+    {summary}
     """
 
     SUMMARY_SYSTEM = """You are an expert summarizer who creates concise summaries of given content.
@@ -77,3 +97,20 @@ class Prompts:
     The summary should be around 1500-2000 words, focusing on the most important aspects of the content.
     Also, return 1-2 word keyword that represent the main idea of the content. It could be from the content or a new word that captures the essence of the content.
     """
+
+    # System prompt for folding older chat turns into the running conversation summary
+    # Format: Input -> {summary: str, turns: List[{sender, message}]}, Output -> {summary: str}
+    CHAT_SUMMARY_SYSTEM = """You maintain a running summary of a tutoring conversation between a student and a tutor.
+    You receive the current summary and the turns that follow it.
+    Update the summary so it also covers the new turns: the topics discussed, the student's questions and misunderstandings, and the explanations already given.
+    Keep details the tutor will need to answer follow-up questions, and drop small talk.
+    Keep the summary concise, at most around 200 words.
+    """
+
+    # Map step of map-reduce summarization for documents too large for one prompt
+    # Format: Input -> One section of the content, Output -> plain text summary
+    SUMMARY_CHUNK_SYSTEM = """You are an expert summarizer working on one section of a longer document.
+    Your task is to extract the main ideas, key points, definitions and important details of this section.
+    The summary will later be combined with summaries of the other sections, so do not add an introduction or conclusion.
+    Keep the summary concise, ideally around 200-400 words.
+    """
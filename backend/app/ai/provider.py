@@ -1,16 +1,105 @@
-from openai import OpenAI
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+from pydantic import BaseModel
 from dotenv import load_dotenv
 from .prompts import Prompts
+from .backends import Backend, Completion, TextStream, get_backend
+from .cache import response_cache
+from .resilience import AI_MAX_RETRIES, AIProviderError, is_transient, retry_delay
+from .routing import Route, get_routes
+from .tokens import (
+    TRIMMABLE_FIELDS,
+    estimate_tokens,
+    field_tokens,
+    get_token_budget,
+    trim_field,
+    usage_tracker,
+)
 import app.db.schemas as schemas
+from app.metrics import Counter, Histogram
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Task latency as seen by callers, by where the result came from:
+# local (no model call needed), cache, llm or error
+task_latency = Histogram(
+    "ai_task_duration_seconds", "AI task latency by task and source", ("task", "source")
+)
+# Latency of single API attempts, without queueing for concurrency or quota
+api_latency = Histogram(
+    "ai_api_call_duration_seconds",
+    "LLM API call latency by task, backend, model and outcome",
+    ("task", "backend", "model", "outcome"),
+)
+route_fallbacks = Counter(
+    "ai_route_fallbacks_total",
+    "Calls moved to the next route after this backend and model failed",
+    ("task", "backend", "model"),
+)
+fallback_responses = Counter(
+    "ai_fallback_responses_total",
+    "Task results replaced by the task's fallback because the model gave no output",
+    ("task",),
+)
+
+
+@dataclass
+class CompletionRequest:
+    """
+    Everything a task needs from a single chat completion.
+    Args:
+        system_prompt (str): The system prompt to guide the AI
+        user_prompt (str): The user's input or content to process
+        structured_output (type[BaseModel] | None): Schema for structured output
+        fallback (dict | None): Result returned when structured output is missing
+        response_key (str | None): Key used to wrap plain text output in a dict
+        task (str): Task name, filled in by _build_request
+        max_output_tokens (int | None): Completion cap from the task's token budget
+        history (list[dict] | None): Earlier chat turns as {"role", "content"}
+            messages, sent between the system and user prompts
+    """
+
+    system_prompt: str
+    user_prompt: str
+    structured_output: type[BaseModel] | None = None
+    fallback: dict | None = None
+    response_key: str | None = None
+    task: str = ""
+    max_output_tokens: int | None = None
+    history: list[dict] | None = None
+
+    @property
+    def estimated_tokens(self) -> int:
+        return (
+            estimate_tokens(self.system_prompt)
+            + estimate_tokens(self.user_prompt)
+            + sum(estimate_tokens(turn["content"]) for turn in self.history or [])
+        )
+
 
 class AIProvider:
-    def __init__(self):
-        # Initialize OpenAI client with GPT-4.1 model
-        self.client = OpenAI()
-        self.model = "gpt-4.1"
+    # Concurrency limits and in-flight calls are shared by every provider
+    # instance in the process
+    _semaphores: dict[str, asyncio.Semaphore] = {}
+    _inflight = SingleFlight()
+
+    def __init__(
+        self,
+        concurrency_limits: dict[str, int] | None = None,
+        routes: dict[str, list[Route]] | None = None,
+    ):
+        # Backend and model per task come from the routing table (app/ai/routing.py);
+        # routes given here take precedence, e.g. to pin a task to the offline backend
+        self.routes = routes or {}
         # Map of supported AI tasks to their handler methods
         self.task_handlers = {
             "essay": self._handle_essay_generation,
@@ -19,132 +108,468 @@ class AIProvider:
             "grade_mcq": self._handle_mcq_grading,
             "chat": self._handle_chat,
             "summarize": self._handle_summarize,
+            "summarize_chunk": self._handle_summarize_chunk,
+            "summarize_chat": self._handle_summarize_chat,
         }
+        self.concurrency_limits = concurrency_limits or {}
 
-    def execute(self, task: str, data: dict) -> dict:
+    def execute(self, task: str, data: dict, use_cache: bool = True) -> dict:
         """
-        Main public method to execute AI tasks.
+        Synchronous entry point, kept for scripts and one-off jobs.
+        Only the in-memory cache tier is consulted on this path.
         Args:
             task (str): The type of task to execute
             data (dict): The data required for the task
+            use_cache (bool): Set to False to bypass the response cache
         Returns:
             dict: The result of the task execution
+        Raises:
+            AIProviderError: If the completion failed after retries.
         """
+        start = time.perf_counter()
+        source = "error"
+        try:
+            result, source = self._execute(task, data, use_cache)
+            return result
+        finally:
+            task_latency.observe((task, source), time.perf_counter() - start)
+
+    def _execute(self, task: str, data: dict, use_cache: bool) -> tuple[dict, str]:
+        request = self._build_request(task, data)
+        if isinstance(request, dict):
+            return request, "local"
+
+        key = self._cache_key(task, request)
+        if use_cache:
+            cached = response_cache.get(key)
+            if cached is not None:
+                return self._finalize(request, cached), "cache"
+
+        result = self._call(request)
+        if self._is_cacheable(request, result):
+            response_cache.set(key, result)
+        return self._finalize(request, result), "llm"
+
+    async def execute_async(self, task: str, data: dict, use_cache: bool = True) -> dict:
+        """
+        Main public method to execute AI tasks from async code without
+        blocking the event loop.
+        Args:
+            task (str): The type of task to execute
+            data (dict): The data required for the task
+            use_cache (bool): Set to False for tasks that need fresh output
+        Returns:
+            dict: The result of the task execution
+        Raises:
+            AIProviderError: If the completion failed after retries.
+        """
+        start = time.perf_counter()
+        source = "error"
+        try:
+            result, source = await self._execute_async(task, data, use_cache)
+            return result
+        finally:
+            task_latency.observe((task, source), time.perf_counter() - start)
+
+    async def _execute_async(
+        self, task: str, data: dict, use_cache: bool
+    ) -> tuple[dict, str]:
+        request = self._build_request(task, data)
+        if isinstance(request, dict):
+            return request, "local"
+
+        key = self._cache_key(task, request)
+        if not use_cache:
+            result = await self._complete(task, key, request)
+            return self._finalize(request, result), "llm"
+
+        cached = await response_cache.get_async(key)
+        if cached is not None:
+            return self._finalize(request, cached), "cache"
+        # Identical calls already in flight share one completion; each caller
+        # gets its own copy, like cache hits do
+        result = await self._inflight.do(
+            key, lambda: self._complete(task, key, request)
+        )
+        return self._finalize(request, copy.deepcopy(result)), "llm"
+
+    async def _complete(self, task: str, key: str, request: CompletionRequest):
+        async with self._get_semaphore(task):
+            result = await self._call_async(request)
+        # Fresh results are still stored so later cached calls can reuse them
+        if self._is_cacheable(request, result):
+            await response_cache.set_async(key, task, result)
+        return result
+
+    async def stream_async(self, task: str, data: dict) -> AsyncIterator[str]:
+        """
+        Streams the text of a plain-text task as tokens arrive.
+        Args:
+            task (str): The type of task to execute, must not use structured output
+            data (dict): The data required for the task
+        Yields:
+            str: Text deltas in the order produced by the model
+        Raises:
+            AIProviderError: If the stream could not be opened, or broke off.
+        """
+        request = self._build_request(task, data)
+        if isinstance(request, dict):
+            yield str(request.get("response", ""))
+            return
+        if request.structured_output:
+            raise ValueError(f"Task does not support streaming: {task}")
+
+        async with self._get_semaphore(task):
+            stream = await self._call_async(request, self._open_stream)
+            try:
+                async for delta in stream:
+                    yield delta
+            except Exception as e:
+                # Part of the answer has been sent already, so it can't be retried
+                raise AIProviderError(f"AI streaming completion failed: {e}") from e
+            usage_tracker.record(task, request.estimated_tokens, stream.usage)
+
+    def _build_request(self, task: str, data: dict) -> CompletionRequest | dict:
         handler = self.task_handlers.get(task)
         if not handler:
             raise ValueError(f"Unknown task: {task}")
+        request = handler(data)
+        if isinstance(request, dict):
+            return request
+
+        budget = get_token_budget(task)
+        overflow = request.estimated_tokens - budget["input"]
+        if overflow > 0:
+            request = self._trim_request(task, handler, data, overflow)
+        request.task = task
+        request.max_output_tokens = budget["output"]
+        return request
+
+    def _trim_request(self, task: str, handler, data: dict, overflow: int):
+        """
+        Shortens the task's trimmable inputs, largest first, by about
+        `overflow` tokens and rebuilds the request from them.
+        """
+        data = dict(data)
+        fields = [field for field in TRIMMABLE_FIELDS.get(task, []) if data.get(field)]
+        for field in sorted(fields, key=lambda f: field_tokens(data[f]), reverse=True):
+            if overflow <= 0:
+                break
+            size = field_tokens(data[field])
+            data[field] = trim_field(data[field], max(size - overflow, 0))
+            overflow -= size - field_tokens(data[field])
+
+        if overflow > 0:
+            logger.warning(
+                "Prompt for task %s exceeds its token budget by ~%d tokens", task, overflow
+            )
+        usage_tracker.record_trim(task)
         return handler(data)
 
-    def _create_completion(
-        self,
-        system_prompt: str,
-        user_prompt: str,
-        structured_output=None,
-    ) -> str | dict:
+    def _cache_key(self, task: str, request: CompletionRequest) -> str:
+        user_prompt = request.user_prompt
+        if request.history:
+            # Earlier turns change the answer as much as the prompt does
+            user_prompt = json.dumps([request.history, user_prompt])
+        # Keyed by the primary route, answers of other models are not reused
+        return response_cache.make_key(
+            task,
+            str(self._get_routes(task)[0]),
+            request.system_prompt,
+            user_prompt,
+            request.structured_output,
+        )
+
+    def _is_cacheable(self, request: CompletionRequest, result: str | dict | None) -> bool:
+        if request.structured_output:
+            return isinstance(result, dict)
+        return bool(result)
+
+    def _get_semaphore(self, task: str) -> asyncio.Semaphore:
+        """
+        Returns the semaphore bounding concurrent calls for a task.
+        Limits come from the constructor, then AI_MAX_CONCURRENCY_<TASK>,
+        then AI_MAX_CONCURRENCY (default 8).
+        """
+        semaphore = self._semaphores.get(task)
+        if semaphore is None:
+            limit = self.concurrency_limits.get(task) or int(
+                os.getenv(
+                    f"AI_MAX_CONCURRENCY_{task.upper()}",
+                    os.getenv("AI_MAX_CONCURRENCY", "8"),
+                )
+            )
+            semaphore = asyncio.Semaphore(max(1, limit))
+            self._semaphores[task] = semaphore
+        return semaphore
+
+    def _finalize(self, request: CompletionRequest, result: str | dict | None) -> dict:
+        if request.structured_output:
+            if isinstance(result, dict):
+                return result
+            fallback_responses.inc((request.task,))
+            return dict(request.fallback or {})
+        return {request.response_key or "response": result}
+
+    def _build_messages(self, request: CompletionRequest) -> list[dict]:
+        system_prompt = request.system_prompt
+        if request.structured_output:
+            system_prompt += "\nYou must respond with a JSON object that matches the specified schema."
+        return [
+            {"role": "system", "content": system_prompt},
+            *(request.history or []),
+            {"role": "user", "content": request.user_prompt},
+        ]
+
+    def _parse_completion(
+        self, request: CompletionRequest, completion: Completion
+    ) -> str | dict | None:
+        usage_tracker.record(request.task, request.estimated_tokens, completion.usage)
+        result = completion.result
+        # A refusal has no structured output; _finalize falls back for it
+        if result is None and not request.structured_output:
+            raise AIProviderError(f"AI model returned no content for task {request.task}")
+        return result
+
+    def _complete_sync(
+        self, backend: Backend, model: str, request: CompletionRequest
+    ) -> str | dict | None:
         """
         Helper method to create chat completions
         Args:
-            system_prompt (str): The system prompt to guide the AI
-            user_prompt (str): The user's input or content to process
-            structured_output (dict | None): JSON schema for structured output.
-                Example: {
-                    "type": "object",
-                    "properties": {
-                        "score": {"type": "number"},
-                        "feedback": {"type": "array", "items": {"type": "string"}}
-                    },
-                    "required": ["score", "feedback"]
-                }
+            backend (Backend): Backend of the route being tried
+            model (str): Model of the route being tried
+            request (CompletionRequest): Prompts, output schema and token cap,
+                e.g. structured_output=schemas.EssayGradingResponse
         Returns:
-            str | dict: String response or structured JSON object if schema provided
+            str | dict | None: String response, or structured JSON object if
+                schema provided (None if the model refused)
         """
-        try:
-            if structured_output:
-                system_prompt += "\nYou must respond with a JSON object that matches the specified schema."
-
-                response = self.client.beta.chat.completions.parse(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                    response_format=structured_output,
-                )
+        completion = backend.complete(
+            model,
+            self._build_messages(request),
+            request.structured_output,
+            request.max_output_tokens,
+        )
+        return self._parse_completion(request, completion)
 
-                result = response.choices[0].message.parsed
-                if result:
-                    result = result.dict()
-            else:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt},
-                    ],
-                )
-                result = response.choices[0].message.content
+    async def _complete_async(
+        self, backend: Backend, model: str, request: CompletionRequest
+    ) -> str | dict | None:
+        """
+        Async counterpart of _complete_sync
+        """
+        completion = await backend.complete_async(
+            model,
+            self._build_messages(request),
+            request.structured_output,
+            request.max_output_tokens,
+        )
+        return self._parse_completion(request, completion)
 
-            if result is None:
-                return self._get_dummy_response(user_prompt)
+    async def _open_stream(
+        self, backend: Backend, model: str, request: CompletionRequest
+    ) -> TextStream:
+        return await backend.open_stream(
+            model, self._build_messages(request), request.max_output_tokens
+        )
 
-            return result
-        except Exception as e:
-            print(f"Error in AI completion: {e}")
-            return self._get_dummy_response(user_prompt)
+    def _call(self, request: CompletionRequest) -> str | dict | None:
+        """
+        Runs the completion on the task's routes in order. Each route is
+        tried behind its backend's rate limiter and circuit breaker, retrying
+        transient errors with backoff; when it fails for good, the next route
+        takes over.
+        Raises:
+            AIProviderError: If every route failed.
+        """
+        routes = self._get_routes(request.task)
+        for i, route in enumerate(routes):
+            backend = get_backend(route.backend)
+            for attempt in range(AI_MAX_RETRIES + 1):
+                try:
+                    wait, trial = self._admit(backend, request)
+                except AIProviderError as e:
+                    error = e
+                    break
+                try:
+                    time.sleep(wait)
+                    started = time.perf_counter()
+                    try:
+                        result = self._complete_sync(backend, route.model, request)
+                    except Exception as e:
+                        self._observe_attempt(request, route, started, e)
+                        error = AIProviderError(f"AI completion failed on {route}: {e}")
+                        error.__cause__ = e
+                        if not self._should_retry(backend, e, attempt):
+                            break
+                        time.sleep(retry_delay(attempt, e))
+                    else:
+                        self._observe_attempt(request, route, started)
+                        backend.circuit_breaker.record_success()
+                        return result
+                finally:
+                    if trial:
+                        backend.circuit_breaker.end_trial()
+            if i == len(routes) - 1:
+                raise error
+            self._fall_back(request, route, error)
+        raise AssertionError("unreachable")
 
-    def _handle_essay_generation(self, data: dict) -> dict:
+    async def _call_async(
+        self,
+        request: CompletionRequest,
+        call: Callable[[Backend, str, CompletionRequest], Awaitable] | None = None,
+    ):
         """
-        Handles essay generation task
+        Async counterpart of _call.
+        Args:
+            request (CompletionRequest): The request to run
+            call: Makes one attempt on a backend and model, _complete_async by
+                default; _open_stream retries until a stream is open.
         """
-        result = self._create_completion(
-            Prompts.ESSAY_SYSTEM,
-            f"""Generate an essay prompt and expected answer based on the following content:\n\n{data.get('content', '')}""",
-            structured_output=schemas.EssayContent,
+        call = call or self._complete_async
+        routes = self._get_routes(request.task)
+        for i, route in enumerate(routes):
+            backend = get_backend(route.backend)
+            for attempt in range(AI_MAX_RETRIES + 1):
+                try:
+                    wait, trial = self._admit(backend, request)
+                except AIProviderError as e:
+                    error = e
+                    break
+                try:
+                    await asyncio.sleep(wait)
+                    started = time.perf_counter()
+                    try:
+                        result = await call(backend, route.model, request)
+                    except Exception as e:
+                        self._observe_attempt(request, route, started, e)
+                        error = AIProviderError(f"AI completion failed on {route}: {e}")
+                        error.__cause__ = e
+                        if not self._should_retry(backend, e, attempt):
+                            break
+                        await asyncio.sleep(retry_delay(attempt, e))
+                    else:
+                        self._observe_attempt(request, route, started)
+                        backend.circuit_breaker.record_success()
+                        return result
+                finally:
+                    # A cancelled trial call records no outcome of its own
+                    if trial:
+                        backend.circuit_breaker.end_trial()
+            if i == len(routes) - 1:
+                raise error
+            self._fall_back(request, route, error)
+        raise AssertionError("unreachable")
+
+    def _get_routes(self, task: str) -> list[Route]:
+        return self.routes.get(task) or get_routes(task)
+
+    def _admit(self, backend: Backend, request: CompletionRequest) -> tuple[float, bool]:
+        """
+        Checks the backend's circuit breaker and reserves quota.
+        Returns:
+            tuple[float, bool]: Seconds to wait before sending the request, and
+                whether it is the circuit breaker's half-open trial call.
+        Raises:
+            CircuitOpenError: If the breaker is open.
+        """
+        trial = backend.circuit_breaker.check()
+        if backend.rate_limiter is None:
+            return 0.0, trial
+        return backend.rate_limiter.reserve(self._quota_tokens(request)), trial
+
+    def _should_retry(self, backend: Backend, error: Exception, attempt: int) -> bool:
+        logger.warning(
+            "Error in AI completion on %s (attempt %d): %s", backend.name, attempt + 1, error
         )
+        if not is_transient(error):
+            # The API answered, only this request was bad
+            backend.circuit_breaker.record_success()
+            return False
+        backend.circuit_breaker.record_failure()
+        return attempt < AI_MAX_RETRIES and backend.circuit_breaker.state == "closed"
 
-        if isinstance(result, dict):
-            return result
+    def _fall_back(self, request: CompletionRequest, route: Route, error: Exception):
+        logger.warning(
+            "AI route %s failed for task %s, trying the next: %s", route, request.task, error
+        )
+        route_fallbacks.inc((request.task, route.backend, route.model))
 
-        return {
-            "prompt": "Failed to generate essay prompt",
-            "expected_answer": "No answer generated",
-        }
+    def _observe_attempt(
+        self,
+        request: CompletionRequest,
+        route: Route,
+        started: float,
+        error: Exception | None = None,
+    ):
+        if error is None:
+            outcome = "ok"
+        else:
+            outcome = "transient_error" if is_transient(error) else "error"
+        api_latency.observe(
+            (request.task, route.backend, route.model, outcome),
+            time.perf_counter() - started,
+        )
+
+    def _quota_tokens(self, request: CompletionRequest) -> int:
+        # Rate limits count the prompt plus the completion cap
+        return request.estimated_tokens + (request.max_output_tokens or 0)
 
-    def _handle_mcq_generation(self, data: dict) -> dict:
+    def _handle_essay_generation(self, data: dict) -> CompletionRequest:
         """
-        Handles MCQ generation task
+        Handles essay generation task
         """
-        result = self._create_completion(
-            Prompts.MCQ_SYSTEM,
-            f"""Generate 20 multiple choice questions based on the following content:\n\n{data.get('content', '')}""",
-            structured_output=schemas.MCQContent,
+        return CompletionRequest(
+            system_prompt=Prompts.ESSAY_SYSTEM,
+            user_prompt=f"""Generate an essay prompt and expected answer based on the following content:\n\n{data.get('content', '')}""",
+            structured_output=schemas.EssayContent,
+            fallback={
+                "prompt": "Failed to generate essay prompt",
+                "expected_answer": "No answer generated",
+            },
         )
 
-        if isinstance(result, dict):
-            return result
-        return {"questions": []}
+    def _handle_mcq_generation(self, data: dict) -> CompletionRequest:
+        """
+        Handles MCQ generation task
+        """
+        explained = data.get("explanations", False)
+        return CompletionRequest(
+            system_prompt=(
+                Prompts.MCQ_EXPLAINED_SYSTEM if explained else Prompts.MCQ_SYSTEM
+            ),
+            user_prompt=f"""Generate {data.get('count', 20)} multiple choice questions based on the following content:\n\n{data.get('content', '')}""",
+            structured_output=(
+                schemas.ExplainedMCQContent if explained else schemas.MCQContent
+            ),
+            fallback={"questions": []},
+        )
 
-    def _handle_essay_grading(self, data: dict) -> dict:
+    def _handle_essay_grading(self, data: dict) -> CompletionRequest:
         """
         Handles essay grading task
         """
+        passages = data.get("passages")
         system_prompt = Prompts.GRADE_ESSAY_SYSTEM.format(
             prompt=data.get("prompt", ""),
-            content=data.get("content", ""),
+            content=(
+                self._format_passages(passages)
+                if passages is not None
+                else data.get("content", "")
+            ),
             expected_answer=data.get("expected_answer", ""),
         )
 
-        result = self._create_completion(
+        return CompletionRequest(
             system_prompt=system_prompt,
             user_prompt=f"""Grade this essay:\n\n{data.get('essay', '')}""",
             structured_output=schemas.EssayGradingResponse,
+            fallback={"score": 0, "feedback": ["Failed to grade essay properly"]},
         )
 
-        if isinstance(result, dict):
-            return result
-        return {"score": 0, "feedback": ["Failed to grade essay properly"]}
-
-    def _handle_mcq_grading(self, data: dict) -> dict:
+    def _handle_mcq_grading(self, data: dict) -> CompletionRequest:
         """
         Handles MCQ grading task
         """
@@ -153,54 +578,91 @@ class AIProvider:
             correct_answers=data.get("correct_answers", []),
         )
 
-        result = self._create_completion(
+        return CompletionRequest(
             system_prompt=system_prompt,
             user_prompt=f"""Grade these answers:\n\n{data.get('user_answers', [])}""",
             structured_output=schemas.MCQGradingResponse,
+            fallback={"feedback": []},
         )
 
-        if isinstance(result, dict):
-            return result
-
-        return {"feedback": []}
-
-    def _handle_chat(self, data: dict) -> dict:
+    def _handle_chat(self, data: dict) -> CompletionRequest | dict:
         """
         Handles chat/tutoring task
         """
         system_prompt = Prompts.CHAT_SYSTEM.format(
-            content=data.get("content", ""),
             assessment=data.get("assessment", {}),
+            overview=data.get("overview") or "No overview available.",
+            passages=self._format_passages(data.get("passages", [])),
+            summary=data.get("summary") or "No earlier conversation.",
         )
 
         if not data.get("message"):
             return {"response": "Please provide a message to chat with the AI."}
 
-        return {
-            "response": self._create_completion(system_prompt, data.get("message", ""))
-        }
+        return CompletionRequest(
+            system_prompt=system_prompt,
+            user_prompt=data.get("message", ""),
+            response_key="response",
+            history=[
+                {
+                    "role": "assistant" if turn["sender"] == "bot" else "user",
+                    "content": turn["message"],
+                }
+                for turn in data.get("history", [])
+            ],
+        )
 
-    def _handle_summarize(self, data: dict) -> dict:
+    def _handle_summarize(self, data: dict) -> CompletionRequest:
         """
-        Handles summarization task
+        Handles summarization task. Accepts either raw "content" or the
+        "sections" produced by summarize_chunk, which are merged in order.
         """
+        sections = data.get("sections")
+        if sections:
+            numbered = "\n\n".join(
+                f"Section {i}:\n{section}" for i, section in enumerate(sections, 1)
+            )
+            user_prompt = f"""The following are summaries of consecutive sections of one document. Combine them into a single summary of the whole document:\n\n{numbered}"""
+        else:
+            user_prompt = f"""Summarize the following content:\n\n{data.get('content', '')}"""
 
-        result = self._create_completion(
+        return CompletionRequest(
             system_prompt=Prompts.SUMMARY_SYSTEM,
-            user_prompt=f"""Summarize the following content:\n\n{data.get('content', '')}""",
+            user_prompt=user_prompt,
             structured_output=schemas.SummaryResponse,
+            fallback={
+                "summary": "",
+                "keyword": "",
+            },
         )
 
-        if isinstance(result, dict):
-            return result
-
-        return {
-            "summary": "",
-            "keyword": "",
-        }
+    def _handle_summarize_chunk(self, data: dict) -> CompletionRequest:
+        """
+        Handles the summary of one section of a larger document
+        """
+        return CompletionRequest(
+            system_prompt=Prompts.SUMMARY_CHUNK_SYSTEM,
+            user_prompt=f"""Summarize this section of the document:\n\n{data.get('content', '')}""",
+            response_key="summary",
+        )
 
-    def _get_dummy_response(self, prompt: str) -> str:
+    def _handle_summarize_chat(self, data: dict) -> CompletionRequest:
         """
-        Provides dummy responses for testing or when API fails
+        Handles folding older chat turns into the running conversation summary
         """
-        return f"Dummy response for: {prompt}"
+        turns = "\n".join(
+            f"{'Tutor' if turn['sender'] == 'bot' else 'Student'}: {turn['message']}"
+            for turn in data.get("turns", [])
+        )
+        return CompletionRequest(
+            system_prompt=Prompts.CHAT_SUMMARY_SYSTEM,
+            user_prompt=f"""Current summary:\n{data.get('summary') or 'None yet.'}\n\nNew turns:\n{turns}""",
+            structured_output=schemas.ChatSummaryResponse,
+            # An empty summary tells the caller to keep the current one
+            fallback={"summary": ""},
+        )
+
+    def _format_passages(self, passages: list[str]) -> str:
+        if not passages:
+            return "No document passages available."
+        return "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages, 1))
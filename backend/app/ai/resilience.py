@@ -0,0 +1,212 @@
+# Client-side protection of the LLM API: rate limiting, retries and a circuit breaker
+import email.utils
+import os
+import random
+import threading
+import time
+
+import openai
+
+# Defaults suit a mid-tier gpt-4.1 quota; set them to the account's actual limits
+AI_REQUESTS_PER_MINUTE = int(os.getenv("AI_REQUESTS_PER_MINUTE", "500"))
+AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", "450000"))
+AI_MAX_RETRIES = max(0, int(os.getenv("AI_MAX_RETRIES", "4")))
+AI_RETRY_BASE_SECONDS = float(os.getenv("AI_RETRY_BASE_SECONDS", "0.5"))
+AI_RETRY_MAX_SECONDS = float(os.getenv("AI_RETRY_MAX_SECONDS", "30"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class AIProviderError(Exception):
+    """A completion failed; raised instead of returning placeholder text."""
+
+
+class CircuitOpenError(AIProviderError):
+    """The circuit breaker is open and calls fail fast."""
+
+
+class RateLimiter:
+    """
+    Token bucket over requests per minute and tokens per minute.
+    Callers reserve capacity up front and are told how long to wait for it,
+    so the same limiter serves the sync and async completion paths.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = AI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = AI_TOKENS_PER_MINUTE,
+    ):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Take one request and the given tokens from the buckets.
+        Args:
+            tokens (int): Prompt estimate plus the completion cap, as the API counts them.
+        Returns:
+            float: Seconds to wait before sending the request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            self._requests = min(
+                self.request_capacity,
+                self._requests + elapsed * self.request_capacity / 60,
+            )
+            self._tokens = min(
+                self.token_capacity,
+                self._tokens + elapsed * self.token_capacity / 60,
+            )
+            # Buckets may go negative; the deficit is the caller's wait
+            self._requests -= 1
+            self._tokens -= min(tokens, self.token_capacity)
+            wait = max(
+                -self._requests * 60 / self.request_capacity,
+                -self._tokens * 60 / self.token_capacity,
+                0.0,
+            )
+            if wait > 0:
+                self.throttled += 1
+            return wait
+
+    def stats(self) -> dict:
+        return {
+            "available_requests": max(0.0, self._requests),
+            "available_tokens": max(0.0, self._tokens),
+            "throttled": self.throttled,
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive transient failures and fails calls fast for a
+    cooldown; then lets one trial call through and closes if it succeeds.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = AI_BREAKER_FAILURES,
+        cooldown_seconds: float = AI_BREAKER_COOLDOWN_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def check(self) -> bool:
+        """
+        Raise CircuitOpenError while the breaker is open.
+        Returns:
+            bool: Whether the call is the half-open trial; its caller must
+                call end_trial once the call is over, however it ended.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if (
+                self.state == "open"
+                and time.monotonic() - self._opened_at >= self.cooldown_seconds
+            ):
+                # Cooldown over, this call is the trial
+                self.state = "half_open"
+                return True
+            # Open, or half open with the trial call still in flight
+            self.rejected += 1
+            raise CircuitOpenError("AI provider is unavailable, try again shortly")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def end_trial(self):
+        """
+        The trial call is over. If it recorded no outcome, e.g. because it was
+        cancelled, reopen for another cooldown instead of staying half open.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed call may succeed if retried."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        # An exhausted quota is also a 429, but waiting won't help
+        if getattr(error, "code", None) == "insufficient_quota":
+            return False
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """The server's Retry-After hint, in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Malformed header, fall back to backoff
+        return None
+    return max(0.0, date.timestamp() - time.time()) if date else None
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """
+    Seconds to wait before retry number attempt (0-based).
+    Full jitter exponential backoff, but never shorter than Retry-After.
+    """
+    backoff = random.uniform(
+        0, min(AI_RETRY_MAX_SECONDS, AI_RETRY_BASE_SECONDS * 2**attempt)
+    )
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        return min(AI_RETRY_MAX_SECONDS, max(backoff, retry_after))
+    return backoff
+
+
+# Used by the 'openai' backend, shared by every AIProvider instance in the process
+rate_limiter = RateLimiter()
+circuit_breaker = CircuitBreaker()
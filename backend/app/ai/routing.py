@@ -0,0 +1,64 @@
+# Which backend and model serves each AI task, with optional fallbacks
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Route:
+    """A model on a backend, written 'backend:model', e.g. 'openai:gpt-4.1-mini'."""
+
+    backend: str
+    model: str
+
+    def __str__(self) -> str:
+        return f"{self.backend}:{self.model}"
+
+
+# First route serves the task, the rest are tried in order when it fails.
+# Grading MCQs and summarizing are high volume and need no frontier model.
+TASK_ROUTES = {
+    "essay": "openai:gpt-4.1",
+    "mcq": "openai:gpt-4.1",
+    "grade_essay": "openai:gpt-4.1",
+    "grade_mcq": "openai:gpt-4.1-mini",
+    "chat": "openai:gpt-4.1",
+    "summarize": "openai:gpt-4.1-mini",
+    "summarize_chunk": "openai:gpt-4.1-mini",
+    "summarize_chat": "openai:gpt-4.1-mini",
+}
+DEFAULT_ROUTE = "openai:gpt-4.1"
+
+
+def parse_routes(spec: str) -> list[Route]:
+    """
+    Parse a comma separated route chain.
+    Args:
+        spec (str): e.g. 'openai:gpt-4.1-mini,local:llama3.1:8b'; a bare model
+            name means the openai backend.
+    Returns:
+        list[Route]: The routes in order of preference.
+    """
+    routes = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        # Split at the first colon, model tags like 'llama3.1:8b' keep theirs
+        backend, _, model = part.partition(":") if ":" in part else ("openai", "", part)
+        routes.append(Route(backend.strip(), model.strip()))
+    if not routes:
+        raise ValueError(f"Empty AI route: {spec!r}")
+    return routes
+
+
+def get_routes(task: str) -> list[Route]:
+    """
+    The route chain of a task: AI_ROUTE_<TASK>, else AI_ROUTE for every task,
+    else the TASK_ROUTES entry, else DEFAULT_ROUTE.
+    """
+    spec = (
+        os.getenv(f"AI_ROUTE_{task.upper()}")
+        or os.getenv("AI_ROUTE")
+        or TASK_ROUTES.get(task, DEFAULT_ROUTE)
+    )
+    return parse_routes(spec)
@@ -0,0 +1,174 @@
+import os
+
+from app.metrics import CallbackMetric
+
+# Token estimation without a tokenizer dependency.
+# GPT models average roughly four characters of English text per token.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text.
+    Args:
+        text (str): The text to measure
+    Returns:
+        int: Approximate token count, rounded up
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def tokens_to_chars(tokens: int) -> int:
+    return tokens * CHARS_PER_TOKEN
+
+
+# Per-task token budgets: "input" caps the estimated prompt size, "output"
+# caps the completion. Override with AI_INPUT_TOKENS_<TASK> / AI_OUTPUT_TOKENS_<TASK>.
+TASK_TOKEN_BUDGETS = {
+    "essay": {"input": 24000, "output": 2000},
+    # Room for per-option explanations when they are requested
+    "mcq": {"input": 24000, "output": 12000},
+    "grade_essay": {"input": 12000, "output": 1500},
+    "grade_mcq": {"input": 12000, "output": 6000},
+    # Passages, document overview, conversation summary and up to two memory windows of turns
+    "chat": {"input": 10000, "output": 1000},
+    "summarize": {"input": 24000, "output": 4000},
+    "summarize_chunk": {"input": 8000, "output": 1000},
+    "summarize_chat": {"input": 8000, "output": 800},
+}
+DEFAULT_TOKEN_BUDGET = {"input": 16000, "output": 2000}
+
+# Data fields each task may shorten when its prompt is over budget
+TRIMMABLE_FIELDS = {
+    "essay": ["content"],
+    "mcq": ["content"],
+    "grade_essay": ["passages", "content", "expected_answer", "essay"],
+    # Items are shortened, never dropped, so feedback still lines up with the questions
+    "grade_mcq": ["questions", "user_answers", "correct_answers"],
+    "chat": ["passages", "overview", "summary", "message"],
+    "summarize": ["content", "sections"],
+    "summarize_chunk": ["content"],
+    "summarize_chat": ["summary"],
+}
+
+TRIM_MARKER = " [...] "
+# Number of evenly spaced excerpts kept from an over-long text
+TRIM_SEGMENTS = 8
+
+
+def get_token_budget(task: str) -> dict:
+    budget = TASK_TOKEN_BUDGETS.get(task, DEFAULT_TOKEN_BUDGET)
+    return {
+        "input": int(os.getenv(f"AI_INPUT_TOKENS_{task.upper()}", budget["input"])),
+        "output": int(os.getenv(f"AI_OUTPUT_TOKENS_{task.upper()}", budget["output"])),
+    }
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Deterministically shorten text to about max_tokens.
+    Keeps evenly spaced excerpts so the result still covers the whole text
+    instead of only its beginning.
+    Args:
+        text (str): The text to shorten
+        max_tokens (int): Target size in estimated tokens
+    Returns:
+        str: The text itself if it fits, otherwise excerpts joined by TRIM_MARKER
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = tokens_to_chars(max_tokens)
+    segments = max(1, min(TRIM_SEGMENTS, max_chars // 500))
+    segment_chars = max(0, (max_chars - len(TRIM_MARKER) * (segments - 1)) // segments)
+    stride = len(text) / segments
+    excerpts = [
+        text[int(i * stride) : int(i * stride) + segment_chars].strip()
+        for i in range(segments)
+    ]
+    return TRIM_MARKER.join(excerpt for excerpt in excerpts if excerpt)
+
+
+def field_tokens(value) -> int:
+    if isinstance(value, list):
+        return sum(estimate_tokens(str(item)) for item in value)
+    return estimate_tokens(str(value))
+
+
+def trim_field(value, max_tokens: int):
+    """Trim a string, or each string of a list in proportion to its size."""
+    if isinstance(value, list):
+        total = field_tokens(value)
+        if total <= max_tokens:
+            return value
+        ratio = max_tokens / total
+        return [
+            trim_to_tokens(str(item), int(estimate_tokens(str(item)) * ratio))
+            for item in value
+        ]
+    return trim_to_tokens(str(value), max_tokens)
+
+
+class UsageTracker:
+    """Aggregates prompt and completion token usage per task."""
+
+    def __init__(self):
+        self._usage: dict[str, dict[str, int]] = {}
+
+    def _entry(self, task: str) -> dict[str, int]:
+        return self._usage.setdefault(
+            task,
+            {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "estimated_prompt_tokens": 0,
+                "trimmed_requests": 0,
+            },
+        )
+
+    def record(self, task: str, estimated_prompt_tokens: int, usage=None):
+        """
+        Record one completion.
+        Args:
+            task (str): Task name
+            estimated_prompt_tokens (int): Estimate made before the call
+            usage: The `usage` object of the API response, if any
+        """
+        entry = self._entry(task)
+        entry["calls"] += 1
+        entry["estimated_prompt_tokens"] += estimated_prompt_tokens
+        if usage is not None:
+            entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            entry["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def record_trim(self, task: str):
+        self._entry(task)["trimmed_requests"] += 1
+
+    def stats(self) -> dict:
+        return {task: dict(entry) for task, entry in self._usage.items()}
+
+
+# Shared by every AIProvider instance in the process
+usage_tracker = UsageTracker()
+
+CallbackMetric(
+    "ai_tokens_total",
+    "LLM tokens used by task and kind, as reported by the API",
+    ("task", "kind"),
+    lambda: {
+        (task, kind): entry[f"{kind}_tokens"]
+        for task, entry in usage_tracker.stats().items()
+        for kind in ("prompt", "completion")
+    },
+    type_="counter",
+)
+CallbackMetric(
+    "ai_trimmed_requests_total",
+    "Prompts trimmed to fit the task's token budget",
+    ("task",),
+    lambda: {
+        (task,): entry["trimmed_requests"]
+        for task, entry in usage_tracker.stats().items()
+    },
+    type_="counter",
+)
@@ -0,0 +1,81 @@
+# The application's single async engine and session factory, configured from DATABASE_URL
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.metrics import instrument_engine
+import os
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///./assessment.db"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle server connections before typical idle timeouts drop them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Sync driver schemes mapped to their async drivers
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def normalize_database_url(url: str) -> str:
+    """
+    Map plain sqlite:// and postgresql:// URLs to their async drivers.
+    Args:
+        url (str): Database URL, e.g. from the DATABASE_URL environment variable.
+    Returns:
+        str: URL usable with create_async_engine.
+    """
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        raise ValueError(f"Invalid DATABASE_URL: {url}")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def build_engine(url: str):
+    """
+    Create the async engine for a URL, with pool settings for server
+    databases and performance pragmas for SQLite files.
+    """
+    url = normalize_database_url(url)
+    backend = make_url(url).get_backend_name()
+    options: dict = {"echo": DB_ECHO, "pool_pre_ping": backend != "sqlite"}
+    if not (backend == "sqlite" and ":memory:" in url):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    engine = create_async_engine(url, **options)
+
+    if backend == "sqlite":
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            # WAL lets readers run alongside the single writer; NORMAL sync is
+            # durable across application crashes, only an OS crash can lose
+            # the last transactions
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.close()
+
+    # Query counts and latencies for /metrics
+    instrument_engine(engine)
+    return engine
+
+
+DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL))
+engine = build_engine(DATABASE_URL)
+# Session factory with autocommit disabled for explicit transaction control
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
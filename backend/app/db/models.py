@@ -1,6 +1,5 @@
 # Database models for the assessment system
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import declarative_base, deferred, relationship
 from sqlalchemy import (
     Column,
     Integer,
@@ -10,16 +9,23 @@ from sqlalchemy import (
     DateTime,
     JSON,
     Float,
+    LargeBinary,
     CheckConstraint,
+    Index,
+    inspect,
+    text,
 )
 import datetime
+from app.db.engine import engine
 
-# SQLite database configuration
-DATABASE_URL = "sqlite+aiosqlite:///./assessment.db"
-engine = create_async_engine(DATABASE_URL, echo=True)
 Base = declarative_base()
 
 
+def utcnow() -> datetime.datetime:
+    """Column default, evaluated per row. Timestamps are stored as naive UTC."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class Document(Base):
     __tablename__ = "documents"
     id = Column(Integer, primary_key=True, index=True)
@@ -28,9 +34,23 @@ class Document(Base):
     )
     filename = Column(String, index=True)
     path = Column(String)
-    content = Column(Text)
+    # Inline text of documents uploaded before text moved to document_texts;
+    # never loaded implicitly
+    content = deferred(Column(Text), raiseload=True)
     doc_metadata = Column(JSON)
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+
+    @property
+    def content_hash(self) -> str | None:
+        return (self.doc_metadata or {}).get("sha256")
+
+    @property
+    def preview(self) -> str | None:
+        return (self.doc_metadata or {}).get("preview")
+
+    @property
+    def text_length(self) -> int | None:
+        return (self.doc_metadata or {}).get("text_length")
 
 
 class Assessment(Base):
@@ -45,11 +65,11 @@ class Assessment(Base):
     answer = Column(JSON)  # Student's answers
     feedback = Column(JSON)  # AI-generated feedback
     score = Column(Float)
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
     updated_at = Column(
         DateTime,
-        default=datetime.datetime.now(datetime.timezone.utc),
-        onupdate=datetime.datetime.now(datetime.timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
     )
     __table_args__ = (
         CheckConstraint("type IN ('mcq', 'essay')", name="check_assessment_type"),
@@ -63,9 +83,11 @@ class ChatMessage(Base):
     session_id = Column(Integer, ForeignKey("practice_sessions.id"))
     message = Column(Text)
     sender = Column(String)  # 'user' or 'bot'
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
     __table_args__ = (
         CheckConstraint("sender IN ('user', 'bot')", name="check_chatmessage_sender"),
+        # Matches the keyset ORDER BY of load_chat_page
+        Index("ix_chat_messages_session_created", "session_id", "created_at", "id"),
     )
 
 
@@ -74,9 +96,143 @@ class PracticeSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True)
     title = Column(String)
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
+    __table_args__ = (
+        # Matches the keyset ORDER BY of load_practice_sessions
+        Index("ix_practice_sessions_user_created", "user_id", "created_at", "id"),
+    )
+    # Loaded explicitly with load_full_practice_session, never lazily
+    document = relationship(Document, uselist=False, lazy="raise")
+    assessment = relationship(Assessment, uselist=False, lazy="raise")
+    chat_messages = relationship(
+        ChatMessage,
+        order_by=(ChatMessage.created_at, ChatMessage.id),
+        lazy="raise",
+    )
+
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+    session_id = Column(Integer, ForeignKey("practice_sessions.id"), primary_key=True)
+    summary = Column(Text)  # Running summary of the turns folded so far
+    # Sort key of the last message folded into the summary
+    last_created_at = Column(DateTime)
+    last_message_id = Column(Integer)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)  # UUID hex
+    type = Column(String, nullable=False)  # 'generate', 'grade' or 'prefetch'
+    session_id = Column(Integer, ForeignKey("practice_sessions.id"), index=True)
+    payload = Column(JSON)  # Request body the job was submitted with
+    status = Column(String, nullable=False, default="queued", index=True)
+    result = Column(JSON)  # Serialized result once succeeded
+    error = Column(Text)  # Error message once failed
+    # Process running the job, and until when it holds it unless renewed
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime, index=True)  # Naive UTC
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(
+        DateTime,
+        default=utcnow,
+        onupdate=utcnow,
+    )
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="check_job_status",
+        ),
+    )
+
+
+class DocumentText(Base):
+    __tablename__ = "document_texts"
+    content_hash = Column(String, primary_key=True)  # SHA-256 of the uploaded file
+    # Cleaned text as independently zlib-compressed frames of FRAME_CHARS characters
+    compressed = Column(LargeBinary, nullable=False)
+    frame_sizes = Column(JSON, nullable=False)  # Compressed size of each frame
+    length = Column(Integer, nullable=False)  # Characters of uncompressed text
+    created_at = Column(DateTime, default=utcnow)
+
+
+class DocumentSummary(Base):
+    __tablename__ = "document_summaries"
+    content_hash = Column(String, primary_key=True)  # SHA-256 of the uploaded file
+    summary = Column(Text)
+    keyword = Column(String)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class AssessmentDraft(Base):
+    __tablename__ = "assessment_drafts"
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("practice_sessions.id"), index=True)
+    type = Column(String, nullable=False)  # 'essay' or 'mcq'
+    settings = Column(JSON)  # Generation settings the draft was made with
+    content = Column(JSON)  # EssayContent or MCQContent, as for Assessment.content
+    created_at = Column(DateTime, default=utcnow)
+
+
+class DocumentIndex(Base):
+    __tablename__ = "document_indexes"
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(
+        Integer, ForeignKey("documents.id"), unique=True, nullable=False
+    )
+    chunks = Column(JSON)  # Passages in document order
+    postings = Column(JSON)  # term -> [[chunk indexes], [term frequencies]]
+    created_at = Column(DateTime, default=utcnow)
+
+
+class MCQExplanation(Base):
+    __tablename__ = "mcq_explanations"
+    key = Column(String, primary_key=True)  # SHA-256 of question, chosen and correct answer
+    explanation = Column(Text)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)  # Endpoint scope and Idempotency-Key header
+    request_hash = Column(String, nullable=False)  # SHA-256 of the request body
+    response = Column(JSON)
+    created_at = Column(DateTime, default=utcnow)
+    expires_at = Column(DateTime, index=True)  # Naive UTC
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+    key = Column(String, primary_key=True)  # SHA-256 of task, model, prompts, schema
+    task = Column(String, index=True)
+    response = Column(JSON)
+    created_at = Column(DateTime, default=utcnow)
+    expires_at = Column(DateTime, index=True)  # Naive UTC
 
 
 async def init_db():
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Replicas starting together would race creating the same tables
+            await conn.execute(text("SELECT pg_advisory_xact_lock(20240601)"))
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, add their new columns
+        # and indexes too
+        await conn.run_sync(_add_missing_columns)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+
+
+def _add_missing_columns(conn):
+    # New columns are nullable without defaults, so a plain ADD COLUMN suffices
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                )
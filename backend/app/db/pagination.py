@@ -0,0 +1,33 @@
+# Opaque cursors for keyset pagination over (created_at, id)
+import base64
+import datetime
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime.datetime, id_: int) -> str:
+    """
+    Encode the sort key of the last row on a page.
+    Args:
+        created_at (datetime): The row's created_at.
+        id_ (int): The row's primary key, breaking created_at ties.
+    Returns:
+        str: URL-safe cursor string.
+    """
+    payload = json.dumps([created_at.isoformat(), id_])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        created_at, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.datetime.fromisoformat(created_at), int(id_)
+    except Exception:
+        raise ValueError("Invalid cursor")
@@ -1,20 +1,18 @@
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.future import select
+from sqlalchemy import and_, delete, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from typing import Any, cast, List
+import datetime
 from app.db import models
+from app.db.engine import SessionLocal
+from app.db.pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor
 from app.db.schemas import (
     EssayContent,
     MCQContent,
     Assessment,
 )
 
-# SQLite with async driver for concurrent access
-DATABASE_URL = "sqlite+aiosqlite:///./assessment.db"
-engine = create_async_engine(DATABASE_URL, echo=False)
-# Session factory with autocommit disabled for explicit transaction control
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
-
 
 async def create_practice_session(user_id: int, title: str | None):
     """Creates a new practice session with context manager for auto-cleanup"""
@@ -127,53 +125,602 @@ async def get_assessment_by_session(session_id: int):
         return result.scalar_one_or_none()
 
 
-async def save_chat_message(user_id, session_id, message, sender):
+async def save_chat_messages(messages: list[dict]):
+    """Insert a batch of chat messages in one transaction."""
+    if not messages:
+        return
     async with SessionLocal() as session:
-        msg = models.ChatMessage(
-            user_id=user_id, session_id=session_id, message=message, sender=sender
-        )
-        session.add(msg)
+        await session.execute(insert(models.ChatMessage), messages)
         await session.commit()
-        await session.refresh(msg)
-        return msg.id
 
 
-async def load_chat_history(session_id: int):
+async def load_chat_messages_after(
+    session_id: int,
+    after: tuple[datetime.datetime, int] | None,
+    limit: int,
+    newest: bool = False,
+) -> list:
+    """
+    Load chat messages that follow a (created_at, id) position.
+    Args:
+        session_id (int): The session of the messages.
+        after (tuple | None): Sort key of the last message to skip, None for all.
+        limit (int): Maximum number of messages.
+        newest (bool): Take the newest messages instead of the oldest ones.
+    Returns:
+        list: Messages in chronological order.
+    """
+    query = _after_position(
+        select(models.ChatMessage).where(models.ChatMessage.session_id == session_id),
+        after,
+    )
+    if newest:
+        query = query.order_by(
+            models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()
+        )
+    else:
+        query = query.order_by(models.ChatMessage.created_at, models.ChatMessage.id)
+    async with SessionLocal() as session:
+        result = await session.execute(query.limit(limit))
+        messages = list(result.scalars().all())
+    if newest:
+        messages.reverse()
+    return messages
+
+
+async def count_chat_messages_after(
+    session_id: int, after: tuple[datetime.datetime, int] | None
+) -> int:
+    """Count the committed chat messages that follow a (created_at, id) position."""
+    query = _after_position(
+        select(func.count())
+        .select_from(models.ChatMessage)
+        .where(models.ChatMessage.session_id == session_id),
+        after,
+    )
+    async with SessionLocal() as session:
+        return int((await session.execute(query)).scalar_one())
+
+
+def _after_position(query, after: tuple[datetime.datetime, int] | None):
+    if after is None:
+        return query
+    created_at, id_ = after
+    return query.where(
+        or_(
+            models.ChatMessage.created_at > created_at,
+            and_(
+                models.ChatMessage.created_at == created_at,
+                models.ChatMessage.id > id_,
+            ),
+        )
+    )
+
+
+async def get_chat_summary(session_id: int):
+    async with SessionLocal() as session:
+        return await session.get(models.ChatSummary, session_id)
+
+
+async def save_chat_summary(
+    session_id: int, summary: str, last_created_at: datetime.datetime, last_message_id: int
+):
+    async with SessionLocal() as session:
+        await session.merge(
+            models.ChatSummary(
+                session_id=session_id,
+                summary=summary,
+                last_created_at=last_created_at,
+                last_message_id=last_message_id,
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another replica folded the same turns first
+            await session.rollback()
+
+
+async def load_practice_sessions(
+    user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None
+):
+    """
+    Load one page of a user's sessions, newest first.
+    Args:
+        user_id (int): The owner of the sessions.
+        limit (int): Page size.
+        cursor (str | None): next_cursor of the previous page.
+    Returns:
+        tuple[list, str | None]: The sessions and the cursor of the next page,
+            None on the last page.
+    """
+    query = select(models.PracticeSession).where(
+        models.PracticeSession.user_id == user_id
+    )
+    if cursor:
+        created_at, id_ = decode_cursor(cursor)
+        query = query.where(
+            or_(
+                models.PracticeSession.created_at < created_at,
+                and_(
+                    models.PracticeSession.created_at == created_at,
+                    models.PracticeSession.id < id_,
+                ),
+            )
+        )
     async with SessionLocal() as session:
         result = await session.execute(
-            select(models.ChatMessage)
-            .where(models.ChatMessage.session_id == session_id)
-            .order_by(models.ChatMessage.created_at)
+            query.order_by(
+                models.PracticeSession.created_at.desc(),
+                models.PracticeSession.id.desc(),
+            ).limit(limit + 1)
+        )
+        sessions = list(result.scalars().all())
+    return _page(sessions, limit)
+
+
+def _page(rows: list, limit: int) -> tuple[list, str | None]:
+    # One extra row was fetched to tell whether another page exists
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+async def _load_chat_page(
+    session, session_id: int, limit: int, before: str | None
+) -> tuple[list, str | None]:
+    query = select(models.ChatMessage).where(
+        models.ChatMessage.session_id == session_id
+    )
+    if before:
+        created_at, id_ = decode_cursor(before)
+        query = query.where(
+            or_(
+                models.ChatMessage.created_at < created_at,
+                and_(
+                    models.ChatMessage.created_at == created_at,
+                    models.ChatMessage.id < id_,
+                ),
+            )
         )
-        return result.scalars().all()
+    result = await session.execute(
+        query.order_by(
+            models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()
+        ).limit(limit + 1)
+    )
+    messages, cursor = _page(list(result.scalars().all()), limit)
+    # Pages are walked backwards in time but returned in chronological order
+    messages.reverse()
+    return messages, cursor
+
+
+async def load_chat_page(
+    session_id: int, limit: int = DEFAULT_PAGE_SIZE, before: str | None = None
+) -> tuple[list, str | None]:
+    """
+    Load the latest chat messages of a session, or the ones before a cursor.
+    Args:
+        session_id (int): The session of the messages.
+        limit (int): Page size.
+        before (str | None): next_cursor of the previous (newer) page.
+    Returns:
+        tuple[list, str | None]: Messages in chronological order and the
+            cursor of the older page, None when there are no older messages.
+    """
+    async with SessionLocal() as session:
+        return await _load_chat_page(session, session_id, limit, before)
 
 
-async def load_practice_sessions(user_id: int):
+async def load_full_practice_session(
+    session_id: int, message_limit: int = DEFAULT_PAGE_SIZE
+):
+    """
+    Load a practice session with its document, assessment and latest chat
+    messages in one DB session: the one-to-one rows are joined, messages
+    follow in a single keyset query.
+    Returns:
+        tuple: The session (None if missing), its latest messages and the
+            cursor of older messages.
+    """
     async with SessionLocal() as session:
         result = await session.execute(
             select(models.PracticeSession)
-            .where(models.PracticeSession.user_id == user_id)
-            .order_by(models.PracticeSession.created_at.desc())
+            .where(models.PracticeSession.id == session_id)
+            .options(
+                joinedload(models.PracticeSession.document),
+                joinedload(models.PracticeSession.assessment),
+            )
+        )
+        practice_session = result.scalar_one_or_none()
+        if practice_session is None:
+            return None, [], None
+        messages, cursor = await _load_chat_page(
+            session, session_id, message_limit, None
         )
-        sessions = result.scalars().all()
-        return sessions
+        return practice_session, messages, cursor
 
 
-async def get_session_by_id(session_id: int):
+async def check_session_exists(session_id: int) -> bool:
     async with SessionLocal() as session:
         result = await session.execute(
             select(models.PracticeSession).where(
                 models.PracticeSession.id == session_id
             )
         )
+        return result.scalar_one_or_none() is not None
+
+
+async def create_job(job_id: str, type_: str, session_id: int, payload: dict):
+    async with SessionLocal() as session:
+        job = models.Job(
+            id=job_id, type=type_, session_id=session_id, payload=payload
+        )
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+
+async def find_active_job(type_: str, session_id: int, payload: dict):
+    """Queued or running job of a type for a session, with the same payload."""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.Job)
+            .where(
+                models.Job.type == type_,
+                models.Job.session_id == session_id,
+                models.Job.status.in_(("queued", "running")),
+            )
+            .order_by(models.Job.created_at)
+        )
+        for job in result.scalars().all():
+            if job.payload == payload:
+                return job
+        return None
+
+
+async def get_job(job_id: str):
+    async with SessionLocal() as session:
+        return await session.get(models.Job, job_id)
+
+
+async def claim_job(
+    job_id: str, worker_id: str, lease_expires_at: datetime.datetime
+) -> bool:
+    """Atomically moves a queued job to running; False if another worker has it"""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(models.Job)
+            .where(models.Job.id == job_id, models.Job.status == "queued")
+            .values(
+                status="running",
+                worker_id=worker_id,
+                lease_expires_at=lease_expires_at,
+            )
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def renew_job_lease(
+    job_id: str, worker_id: str, lease_expires_at: datetime.datetime
+) -> bool:
+    """Extends a running job's lease; False if the worker no longer holds it"""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            update(models.Job)
+            .where(
+                models.Job.id == job_id,
+                models.Job.worker_id == worker_id,
+                models.Job.status == "running",
+            )
+            .values(lease_expires_at=lease_expires_at)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def finish_job(
+    job_id: str,
+    worker_id: str,
+    status: str,
+    result: dict | None = None,
+    error: str | None = None,
+) -> bool:
+    """Records a job's outcome; False if its lease passed to another worker"""
+    async with SessionLocal() as session:
+        updated = await session.execute(
+            update(models.Job)
+            .where(
+                models.Job.id == job_id,
+                models.Job.worker_id == worker_id,
+                models.Job.status == "running",
+            )
+            .values(
+                status=status,
+                result=result,
+                error=error,
+                lease_expires_at=None,
+            )
+        )
+        await session.commit()
+        return updated.rowcount == 1
+
+
+async def requeue_expired_jobs() -> list[tuple[str, str]]:
+    """
+    Requeues running jobs whose lease expired because their worker died, and
+    returns their (id, type). Jobs a live worker holds are left alone.
+    """
+    expired = or_(
+        models.Job.lease_expires_at.is_(None),
+        models.Job.lease_expires_at < models.utcnow(),
+    )
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.Job.id, models.Job.type).where(
+                models.Job.status == "running", expired
+            )
+        )
+        jobs = [(str(job_id), str(type_)) for job_id, type_ in result.all()]
+        if jobs:
+            await session.execute(
+                update(models.Job)
+                .where(
+                    models.Job.id.in_([job_id for job_id, _ in jobs]),
+                    models.Job.status == "running",
+                    expired,
+                )
+                .values(status="queued", worker_id=None, lease_expires_at=None)
+            )
+            await session.commit()
+        return jobs
+
+
+async def get_queued_jobs() -> list[tuple[str, str]]:
+    """Returns (id, type) of every queued job, oldest first"""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.Job.id, models.Job.type)
+            .where(models.Job.status == "queued")
+            .order_by(models.Job.created_at)
+        )
+        return [(str(job_id), str(type_)) for job_id, type_ in result.all()]
+
+
+async def get_document_text(content_hash: str):
+    async with SessionLocal() as session:
+        return await session.get(models.DocumentText, content_hash)
+
+
+async def save_document_text(
+    content_hash: str, compressed: bytes, frame_sizes: list[int], length: int
+):
+    async with SessionLocal() as session:
+        await session.merge(
+            models.DocumentText(
+                content_hash=content_hash,
+                compressed=compressed,
+                frame_sizes=frame_sizes,
+                length=length,
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # A concurrent upload of the same file stored the same text first
+            await session.rollback()
+
+
+async def get_inline_document_content(document_id: int) -> str | None:
+    """Text of a document stored inline, before document_texts existed."""
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.Document.content).where(models.Document.id == document_id)
+        )
         return result.scalar_one_or_none()
 
 
-async def check_session_exists(session_id: int) -> bool:
+async def save_document_index(document_id: int, chunks: list[str], postings: dict):
     async with SessionLocal() as session:
         result = await session.execute(
-            select(models.PracticeSession).where(
-                models.PracticeSession.id == session_id
+            select(models.DocumentIndex).where(
+                models.DocumentIndex.document_id == document_id
             )
         )
-        return result.scalar_one_or_none() is not None
+        index = result.scalar_one_or_none()
+        if index is None:
+            index = models.DocumentIndex(document_id=document_id)
+            session.add(index)
+        index.chunks = chunks  # type: ignore
+        index.postings = postings  # type: ignore
+        await session.commit()
+        return index.id
+
+
+async def get_document_index(document_id: int):
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.DocumentIndex).where(
+                models.DocumentIndex.document_id == document_id
+            )
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_document_summary(content_hash: str):
+    async with SessionLocal() as session:
+        return await session.get(models.DocumentSummary, content_hash)
+
+
+async def save_document_summary(content_hash: str, summary: str, keyword: str):
+    async with SessionLocal() as session:
+        await session.merge(
+            models.DocumentSummary(
+                content_hash=content_hash, summary=summary, keyword=keyword
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another session with the same document summarized it first
+            await session.rollback()
+
+
+async def save_assessment_draft(
+    session_id: int, type_: str, settings: dict, content: EssayContent | MCQContent
+):
+    async with SessionLocal() as session:
+        draft = models.AssessmentDraft(
+            session_id=session_id,
+            type=type_,
+            settings=settings,
+            content=content.model_dump(),
+        )
+        session.add(draft)
+        await session.commit()
+        return draft.id
+
+
+async def take_assessment_draft(
+    session_id: int, type_: str, settings: dict
+) -> dict | None:
+    """
+    Content of a pending draft of a type made with the same settings, or None.
+    A taken draft is deleted together with the session's other drafts, as a
+    session holds a single assessment; concurrent callers never get the same one.
+    """
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.AssessmentDraft)
+            .where(
+                models.AssessmentDraft.session_id == session_id,
+                models.AssessmentDraft.type == type_,
+            )
+            .order_by(models.AssessmentDraft.created_at)
+        )
+        for draft in result.scalars().all():
+            if draft.settings != settings:
+                continue
+            deleted = await session.execute(
+                delete(models.AssessmentDraft).where(
+                    models.AssessmentDraft.id == draft.id
+                )
+            )
+            if deleted.rowcount != 1:
+                continue
+            await session.execute(
+                delete(models.AssessmentDraft).where(
+                    models.AssessmentDraft.session_id == session_id
+                )
+            )
+            await session.commit()
+            return dict(draft.content or {})
+        return None
+
+
+async def get_mcq_explanations(keys: list[str]) -> dict[str, str]:
+    if not keys:
+        return {}
+    async with SessionLocal() as session:
+        result = await session.execute(
+            select(models.MCQExplanation).where(models.MCQExplanation.key.in_(keys))
+        )
+        return {str(row.key): str(row.explanation) for row in result.scalars().all()}
+
+
+async def save_mcq_explanations(explanations: dict[str, str]):
+    async with SessionLocal() as session:
+        for key, explanation in explanations.items():
+            await session.merge(models.MCQExplanation(key=key, explanation=explanation))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another submission explained the same answers concurrently
+            await session.rollback()
+
+
+async def get_llm_cache_entry(key: str):
+    """Returns a non-expired cached LLM response, deleting it if it has expired"""
+    async with SessionLocal() as session:
+        entry = await session.get(models.LLMCacheEntry, key)
+        if entry is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if entry.expires_at is not None and entry.expires_at < now:
+            await session.delete(entry)
+            await session.commit()
+            return None
+        return entry
+
+
+async def save_llm_cache_entry(
+    key: str, task: str, response: Any, expires_at: datetime.datetime
+):
+    async with SessionLocal() as session:
+        await session.merge(
+            models.LLMCacheEntry(
+                key=key, task=task, response=response, expires_at=expires_at
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # A concurrent identical completion stored its result first
+            await session.rollback()
+
+
+async def delete_expired_llm_cache_entries() -> int:
+    async with SessionLocal() as session:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        result = await session.execute(
+            delete(models.LLMCacheEntry).where(models.LLMCacheEntry.expires_at < now)
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def get_idempotency_record(key: str):
+    """Returns the stored response for an idempotency key unless it has expired"""
+    async with SessionLocal() as session:
+        record = await session.get(models.IdempotencyRecord, key)
+        if record is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if record.expires_at is not None and record.expires_at < now:
+            await session.delete(record)
+            await session.commit()
+            return None
+        return record
+
+
+async def save_idempotency_record(
+    key: str, request_hash: str, response: Any, expires_at: datetime.datetime
+):
+    async with SessionLocal() as session:
+        session.add(
+            models.IdempotencyRecord(
+                key=key,
+                request_hash=request_hash,
+                response=response,
+                expires_at=expires_at,
+            )
+        )
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Another replica answered the same key first, its response wins
+            await session.rollback()
+
+
+async def delete_expired_idempotency_records() -> int:
+    async with SessionLocal() as session:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        result = await session.execute(
+            delete(models.IdempotencyRecord).where(
+                models.IdempotencyRecord.expires_at < now
+            )
+        )
+        await session.commit()
+        return result.rowcount
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Optional, Literal
 import datetime
 
 AssessmentType = Literal["essay", "mcq"]
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
 
 
 # Essay assessment types
@@ -50,6 +51,10 @@ class SummaryResponse(BaseModel):
     )
 
 
+class ChatSummaryResponse(BaseModel):
+    summary: str = Field(description="Updated summary of the conversation so far")
+
+
 # MCQ assessment types
 class MCQQuestion(BaseModel):
     question: str = Field(description="The question text")
@@ -57,6 +62,13 @@ class MCQQuestion(BaseModel):
         description="List of distractor options for the question"
     )
     correct_answer: str = Field(description="The correct answer to the question")
+    # Precomputed feedback, present when generated with explanations
+    explanation: Optional[str] = Field(
+        default=None, description="Why the correct answer is correct"
+    )
+    distractor_explanations: Optional[Dict[str, str]] = Field(
+        default=None, description="Why each wrong option is wrong, keyed by option"
+    )
 
 
 class MCQContent(BaseModel):
@@ -65,6 +77,27 @@ class MCQContent(BaseModel):
     )
 
 
+# MCQ generation with explanations. Structured outputs need every field
+# required and no free-form keys, so explanations are aligned with distractors.
+class ExplainedMCQQuestion(BaseModel):
+    question: str = Field(description="The question text")
+    distractors: List[str] = Field(
+        description="List of distractor options for the question"
+    )
+    correct_answer: str = Field(description="The correct answer to the question")
+    explanation: str = Field(description="Why the correct answer is correct")
+    distractor_explanations: List[str] = Field(
+        description="Why each option in distractors is wrong, in the same order; "
+        "empty string for the correct answer"
+    )
+
+
+class ExplainedMCQContent(BaseModel):
+    questions: List[ExplainedMCQQuestion] = Field(
+        description="List of generated multiple choice questions with explanations"
+    )
+
+
 class PracticeSessionBase(BaseModel):
     id: int
 
@@ -77,6 +110,8 @@ class PracticeSession(PracticeSessionBase):
 
 class PracticeSessions(BaseModel):
     sessions: List[PracticeSession]
+    # Pass as ?cursor= to fetch the next page, None on the last page
+    next_cursor: Optional[str] = None
 
 
 class Assessment(BaseModel):
@@ -100,10 +135,29 @@ class DocumentBase(BaseModel):
 
 class Document(DocumentBase):
     session_id: int
-    content: str
+    # The full text is served in ranges by GET /document/{session_id}/text
+    preview: Optional[str] = None
+    text_length: Optional[int] = None
     doc_metadata: dict
     created_at: datetime.datetime
 
+    @field_validator("doc_metadata", mode="before")
+    @classmethod
+    def _drop_top_level_fields(cls, value):
+        # preview and text_length are stored here but returned at the top level
+        return {
+            key: item
+            for key, item in (value or {}).items()
+            if key not in ("preview", "text_length")
+        }
+
+
+class DocumentTextRange(BaseModel):
+    offset: int
+    text: str
+    # None for documents uploaded before the length was recorded
+    text_length: Optional[int] = None
+
 
 class ChatMessage(BaseModel):
     id: int
@@ -118,3 +172,21 @@ class FullPracticeSession(PracticeSessionBase):
     document: Optional[Document] = None
     assessment: Optional[Assessment] = None
     chat_messages: List[ChatMessage]
+    # Pass as ?before= to /session/{id}/messages for older messages
+    messages_cursor: Optional[str] = None
+
+
+class ChatMessages(BaseModel):
+    messages: List[ChatMessage]
+    next_cursor: Optional[str] = None
+
+
+class Job(BaseModel):
+    id: str
+    type: str
+    session_id: int
+    status: JobStatus
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    updated_at: Optional[datetime.datetime]
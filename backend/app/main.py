@@ -1,9 +1,46 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import logging
+import os
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import upload, generate, chat, session, feedback
+from app.ai.cache import response_cache
+from app.ai.tokens import usage_tracker
+from app.db.models import init_db
+from app import metrics
+from app.db.queries import (
+    delete_expired_idempotency_records,
+    delete_expired_llm_cache_entries,
+)
+from app.routers import upload, generate, chat, session, feedback, jobs, bulk
+from app.services.chat_buffer import chat_buffer
+from app.services.job_service import job_queue
+from app.services.pdf_extraction import shutdown_pool
+
+# Warnings and errors of retries, fallbacks and background work go to stderr
+# next to uvicorn's own logs
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables, drop stale cache rows and start the job workers
+    await init_db()
+    await delete_expired_llm_cache_entries()
+    await delete_expired_idempotency_records()
+    await job_queue.start()
+    chat_buffer.start()
+    yield
+    await job_queue.stop()
+    # Write chat messages still waiting for the next flush
+    await chat_buffer.stop()
+    shutdown_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for all origins (configured for development)
 app.add_middleware(
@@ -13,6 +50,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so its timings include the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Register route modules
 app.include_router(upload.router)
@@ -20,8 +59,26 @@ app.include_router(generate.router)
 app.include_router(feedback.router)
 app.include_router(chat.router)
 app.include_router(session.router)
+app.include_router(jobs.router)
+app.include_router(bulk.router)
 
 
 @app.get("/")
 def root():
     return {"message": "AI Assessment Tool Backend"}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/usage/stats")
+def usage_stats():
+    return usage_tracker.stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    # Prometheus text format, scraped from each replica
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,259 @@
+# In-process Prometheus metrics, rendered in the text exposition format at /metrics
+import bisect
+import logging
+import re
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, wide enough for both DB queries and LLM calls
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry: list["Metric"] = []
+_registry_lock = threading.Lock()
+
+
+class Metric:
+    """
+    Base of all metrics: a name, help text and label names.
+    Samples are keyed by a tuple of label values, in labelnames order.
+    """
+
+    type_ = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        """(suffix, label pairs, value) for every sample of the metric."""
+        raise NotImplementedError
+
+    def _pairs(self, labels: tuple) -> tuple:
+        return tuple(zip(self.labelnames, labels))
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. requests served."""
+
+    type_ = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", self._pairs(k), v) for k, v in self._values.items()]
+
+
+class Histogram(Metric):
+    """
+    Counts observations into buckets. Each observation is one bisect and a
+    few additions; buckets are only made cumulative when scraped.
+    """
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        samples = []
+        for labels, counts, total, count in values:
+            pairs = self._pairs(labels)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", (*pairs, ("le", _format_value(bound))), cumulative))
+            samples.append(("_sum", pairs, total))
+            samples.append(("_count", pairs, count))
+        return samples
+
+
+class CallbackMetric(Metric):
+    """
+    Reads its values from existing stats when scraped, so counters kept
+    elsewhere (cache hits, token usage) cost nothing per request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...],
+        callback: Callable[[], dict[tuple, float]],
+        type_: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.type_ = type_
+
+    def samples(self):
+        return [("", self._pairs(k), v) for k, v in self.callback().items()]
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            logger.exception("Metrics collection error for %s: %s", metric.name, e)
+            continue
+        lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.type_}")
+        for suffix, pairs, value in samples:
+            labels = ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in pairs)
+            lines.append(
+                f"{metric.name}{suffix}{{{labels}}} {_format_value(value)}"
+                if labels
+                else f"{metric.name}{suffix} {_format_value(value)}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(text: str) -> str:
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Errors of background work that has no caller to report them to
+background_errors = Counter(
+    "background_errors_total", "Errors in background tasks by component", ("component",)
+)
+
+# HTTP requests, labelled by route template so path parameters don't explode cardinality
+http_requests = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method, route and status",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Plain ASGI rather than
+    BaseHTTPMiddleware, so streamed responses pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_requests.observe(
+                (
+                    scope["method"],
+                    getattr(route, "path", "unmatched"),
+                    str(status),
+                ),
+                time.perf_counter() - start,
+            )
+
+
+# Database queries, labelled by statement type
+db_queries = Histogram(
+    "db_query_duration_seconds",
+    "Database query latency by statement type",
+    ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+db_errors = Counter(
+    "db_query_errors_total", "Failed database queries by statement type", ("operation",)
+)
+
+_OPERATION = re.compile(r"\s*(\w+)")
+
+
+def _operation(statement: str) -> str:
+    match = _OPERATION.match(statement)
+    return match.group(1).upper() if match else "OTHER"
+
+
+def instrument_engine(engine):
+    """Time every query of an async engine through SQLAlchemy cursor events."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        db_queries.observe((_operation(statement),), time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+        db_errors.inc((_operation(context.statement or ""),))
@@ -0,0 +1,69 @@
+import json
+from typing import AsyncIterator, List
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from app.db import schemas
+from app.services.bulk_service import BULK_MAX_ITEMS, bulk_generate, bulk_grade
+
+router = APIRouter()
+
+
+class BulkGenerateRequest(BaseModel):
+    user_id: int
+    assessment_type: schemas.AssessmentType
+    session_ids: List[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+    question_count: int | None = Field(default=None, ge=1, le=50)
+    explanations: bool = False
+
+
+class BulkGradeItem(BaseModel):
+    session_id: int
+    user_answer: List[str] = Field(min_length=1)
+
+
+class BulkGradeRequest(BaseModel):
+    items: List[BulkGradeItem] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+async def ndjson(results: AsyncIterator[dict]) -> AsyncIterator[str]:
+    # One JSON object per line as items finish, then a summary line
+    counts = {"succeeded": 0, "failed": 0}
+    async for result in results:
+        counts[result["status"]] += 1
+        yield json.dumps(result) + "\n"
+    yield json.dumps({"done": True, **counts}) + "\n"
+
+
+@router.post("/bulk/generate")
+async def generate_bulk(req: BulkGenerateRequest):
+    """Generate assessments for many sessions, e.g. a class created from one syllabus.
+    Sessions run with bounded concurrency and share document text, and the
+    results stream back as NDJSON in completion order.
+    Args:
+        req (BulkGenerateRequest): Sessions plus the settings shared by all of them.
+    Returns:
+        StreamingResponse: One line per session, {"session_id", "status",
+            "assessment" | "error"}, then {"done": true, "succeeded", "failed"}.
+    """
+    # A session listed twice is generated once
+    session_ids = list(dict.fromkeys(req.session_ids))
+    payload = req.model_dump(exclude={"session_ids"})
+    return StreamingResponse(
+        ndjson(bulk_generate(session_ids, payload)), media_type="application/x-ndjson"
+    )
+
+
+@router.post("/bulk/grade")
+async def grade_bulk(req: BulkGradeRequest):
+    """Grade the answers of many sessions at once.
+    Args:
+        req (BulkGradeRequest): The answers of each session.
+    Returns:
+        StreamingResponse: NDJSON lines as for /bulk/generate.
+    """
+    # The last answers given for a session win
+    items = {item.session_id: item.model_dump() for item in req.items}
+    return StreamingResponse(
+        ndjson(bulk_grade(list(items.values()))), media_type="application/x-ndjson"
+    )
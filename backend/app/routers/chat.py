@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from contextlib import aclosing
+from fastapi import APIRouter, Header, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, ValidationError
 from app.ai.provider import AIProvider
+from app.ai.resilience import AIProviderError
 from app.db.queries import (
-    save_chat_message,
     get_document_by_session,
     get_assessment_by_session,
 )
 from app.db.schemas import Assessment
+from app.services.chat_buffer import chat_buffer
+from app.services.chat_memory import chat_memory
+from app.services.document_service import get_document_overview
+from app.services.idempotency import IdempotencyConflict, run_idempotent
+from app.services.retrieval_service import retrieve_passages
 
 router = APIRouter()
 
@@ -25,8 +31,18 @@ class ChatResponse(BaseModel):
     response: str
 
 
+class ChatStreamMessage(BaseModel):
+    # Data model for each message sent over the chat WebSocket
+    user_id: int
+    message: str
+
+
 @router.post("/chat/{session_id}", response_model=ChatResponse)
-async def chat_api(session_id: int, request: ChatRequest):
+async def chat_api(
+    session_id: int,
+    request: ChatRequest,
+    idempotency_key: str | None = Header(default=None),
+):
     # Process chat message within a specific session context
     user_id = request.user_id
     message = request.message
@@ -43,21 +59,118 @@ async def chat_api(session_id: int, request: ChatRequest):
             status_code=404, detail="Assessment not found for this session."
         )
 
-    await save_chat_message(user_id, session_id, message, sender="user")
+    async def respond() -> dict:
+        # Earlier turns, read before this message is added to them
+        summary, history = await chat_memory.get_context(session_id)
+        chat_buffer.add(user_id, session_id, message, sender="user")
 
-    try:
-        response = provider.execute(
+        response = await provider.execute_async(
             "chat",
             data={
                 "message": message,
                 "assessment": assessment.content if assessment else None,
+                "passages": await retrieve_passages(document, message),
+                "overview": await get_document_overview(document),
+                "summary": summary,
+                "history": history,
             },
+            use_cache=False,
         )
         if isinstance(response, dict) and "response" in response:
             response_text = response["response"]
         else:
             response_text = str(response)
-        await save_chat_message(user_id, session_id, response_text, sender="bot")
+        chat_buffer.add(user_id, session_id, response_text, sender="bot")
+        chat_memory.schedule_fold(session_id)
         return {"response": response_text}
+
+    try:
+        # A retried message is answered from the stored reply, not asked again
+        return await run_idempotent(
+            idempotency_key,
+            f"POST /chat/{session_id}",
+            {"user_id": user_id, "message": message},
+            respond,
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AIProviderError as e:
+        # Upstream is rate limited or down; the client may retry later
+        raise HTTPException(status_code=503, detail=f"AI model unavailable: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI model error: {str(e)}")
+
+
+@router.websocket("/ws/chat/{session_id}")
+async def chat_stream(websocket: WebSocket, session_id: int):
+    """Stream tutor responses token by token over a WebSocket.
+    The connection stays open for the whole session, so document and assessment
+    are looked up once and reused for every turn.
+    Client sends: {"user_id": int, "message": str}
+    Server sends: {"type": "token", "content": str} for each delta, then
+        {"type": "done", "response": str} once the full message is buffered
+        for storage (see chat_buffer),
+        or {"type": "error", "detail": str} if a turn fails.
+    """
+    await websocket.accept()
+
+    # Retrieve associated document and assessment once per connection
+    document = await get_document_by_session(session_id)
+    assessment = await get_assessment_by_session(session_id)
+    if document is None:
+        await websocket.close(code=4404, reason="Document not found for this session.")
+        return
+    if assessment is None:
+        await websocket.close(
+            code=4404, reason="Assessment not found for this session."
+        )
+        return
+
+    try:
+        while True:
+            try:
+                request = ChatStreamMessage.model_validate(
+                    await websocket.receive_json()
+                )
+            except (ValidationError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+
+            summary, history = await chat_memory.get_context(session_id)
+            chat_buffer.add(
+                request.user_id, session_id, request.message, sender="user"
+            )
+
+            chunks = []
+            try:
+                data = {
+                    "message": request.message,
+                    "assessment": assessment.content,
+                    "passages": await retrieve_passages(document, request.message),
+                    # Read per turn, the upload's summary may finish later
+                    "overview": await get_document_overview(document),
+                    "summary": summary,
+                    "history": history,
+                }
+                # Closed even if sending fails, releasing the task semaphore
+                # and the upstream stream right away
+                async with aclosing(provider.stream_async("chat", data=data)) as tokens:
+                    async for token in tokens:
+                        chunks.append(token)
+                        await websocket.send_json({"type": "token", "content": token})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json(
+                    {"type": "error", "detail": f"AI model error: {str(e)}"}
+                )
+                continue
+
+            response_text = "".join(chunks)
+            chat_buffer.add(
+                request.user_id, session_id, response_text, sender="bot"
+            )
+            chat_memory.schedule_fold(session_id)
+            await websocket.send_json({"type": "done", "response": response_text})
+    except WebSocketDisconnect:
+        return
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
 from pydantic import BaseModel
 from typing import List
-from app.services.feedback_service import process_assessment_feedback
-from app.db.queries import update_assessment
-from app.db.schemas import Assessment
+from app.services.idempotency import IdempotencyConflict, run_idempotent
+from app.services.job_service import job_queue
+from app.db import schemas
 
 router = APIRouter()
 
@@ -12,50 +12,40 @@ class GradeRequest(BaseModel):
     user_answer: List[str]
 
 
-@router.post("/grade/{session_id}", response_model=Assessment)
-async def grade_essay(session_id: int, req: GradeRequest):
-    """Process feedback for an assessment based on user answers.
+@router.post("/grade/{session_id}", response_model=schemas.Job, status_code=202)
+async def grade_essay(
+    session_id: int,
+    req: GradeRequest,
+    idempotency_key: str | None = Header(default=None),
+):
+    """Queue feedback processing for an assessment based on user answers.
     Args:
         session_id (int): The ID of the session for which feedback is being processed.
         req (GradeRequest): The request containing user answers.
+        idempotency_key (str | None): Optional Idempotency-Key header; a repeat
+            replays the first response.
     Returns:
-        Assessment: The updated assessment object with feedback and score.
+        Job: The queued job. Poll GET /jobs/{id} for the updated Assessment
+            with feedback and score.
     """
     if not req.user_answer or not isinstance(req.user_answer, list):
         raise HTTPException(
             status_code=400, detail="user_answer must be a non-empty list."
         )
 
-    try:
-        result = await process_assessment_feedback(
-            session_id, user_answer=req.user_answer
-        )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to process feedback: {str(e)}"
-        )
-
-    if not result:
-        raise HTTPException(
-            status_code=500, detail="Failed to process feedback. Please try again."
+    async def submit() -> dict:
+        job = await job_queue.submit("grade", session_id, req.model_dump())
+        return schemas.Job.model_validate(job, from_attributes=True).model_dump(
+            mode="json"
         )
 
     try:
-        # Update the assessment with the feedback, score, and user answer
-        assessment = await update_assessment(
-            session_id=session_id,
-            answer=req.user_answer,
-            feedback=result.feedback,
-            score=result.score,
+        return await run_idempotent(
+            idempotency_key, f"POST /grade/{session_id}", req.model_dump(), submit
         )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Failed to update assessment: {str(e)}"
+            status_code=500, detail=f"Failed to queue grading: {str(e)}"
         )
-
-    if not assessment:
-        raise HTTPException(status_code=500, detail="Failed to update assessment.")
-
-    return assessment
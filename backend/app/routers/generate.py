@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.services.generate_service import generate_question
-from app.db.queries import create_assessment
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel, Field
+from app.services.idempotency import IdempotencyConflict, run_idempotent
+from app.services.job_service import job_queue
 from app.db import schemas
 
 router = APIRouter()
@@ -10,41 +10,42 @@ router = APIRouter()
 class GenerateRequest(BaseModel):
     user_id: int
     assessment_type: schemas.AssessmentType
-
-
-@router.post("/generate/{session_id}", response_model=schemas.Assessment)
-async def generate(session_id: int, req: GenerateRequest):
-    """Generate an essay prompt or MCQ questions based on the session ID and assessment type.
+    # Number of MCQ questions, defaults to MCQ_QUESTION_COUNT
+    question_count: int | None = Field(default=None, ge=1, le=50)
+    # Generate MCQ explanations up front so grading needs no LLM call
+    explanations: bool = False
+
+
+@router.post("/generate/{session_id}", response_model=schemas.Job, status_code=202)
+async def generate(
+    session_id: int,
+    req: GenerateRequest,
+    idempotency_key: str | None = Header(default=None),
+):
+    """Queue generation of an essay prompt or MCQ questions for a session.
+    Identical requests while a generation is running get the same job, and
+    a repeated Idempotency-Key replays the first response.
     Args:
         session_id (int): The ID of the session for which the assessment is being generated.
         req (GenerateRequest): The request containing user ID and assessment type.
+        idempotency_key (str | None): Optional Idempotency-Key header.
     Returns:
-        Assessment: The generated assessment object containing the question and type.
+        Job: The queued job. Poll GET /jobs/{id} for the generated Assessment.
     """
-    try:
-        # Generate the question based on the session ID and assessment type
-        generated_question = await generate_question(session_id, req.assessment_type)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Failed to generate question: {str(e)}"
-        )
 
-    if not generated_question:
-        raise HTTPException(
-            status_code=500, detail="Failed to generate question. Please try again."
+    async def submit() -> dict:
+        job = await job_queue.submit("generate", session_id, req.model_dump())
+        return schemas.Job.model_validate(job, from_attributes=True).model_dump(
+            mode="json"
         )
 
     try:
-        # Update the assessment in the database with the generated question
-        assessment = await create_assessment(
-            session_id=session_id,
-            user_id=req.user_id,
-            type_=req.assessment_type,
-            content=generated_question,
+        return await run_idempotent(
+            idempotency_key, f"POST /generate/{session_id}", req.model_dump(), submit
         )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Failed to save assessment: {str(e)}"
+            status_code=500, detail=f"Failed to queue generation: {str(e)}"
         )
-
-    return assessment
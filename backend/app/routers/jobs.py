@@ -0,0 +1,49 @@
+import json
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from app.db.queries import get_job
+from app.db import schemas
+from app.services.job_service import job_queue
+
+router = APIRouter()
+
+# Upper bounds for long-polling and event streams, in seconds
+MAX_WAIT_SECONDS = 30
+MAX_STREAM_SECONDS = 300
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+async def get_job_status(
+    job_id: str, wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)
+):
+    """Retrieve a job's status and, once succeeded, its result.
+    Args:
+        job_id (str): The ID returned when the job was queued.
+        wait (float): Seconds to long-poll for the job to finish.
+    Returns:
+        Job: The job's current state.
+    """
+    if wait > 0:
+        job = await job_queue.wait(job_id, wait)
+    else:
+        job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Subscribe to a job's status changes as Server-Sent Events.
+    Each event carries the serialized Job; the stream ends once it finishes.
+    """
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        async for job in job_queue.subscribe(job_id, MAX_STREAM_SECONDS):
+            data = jsonable_encoder(schemas.Job.model_validate(job, from_attributes=True))
+            yield f"event: {job.status}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
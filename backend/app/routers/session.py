@@ -1,12 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from app.db.queries import (
+    load_chat_page,
     load_practice_sessions,
-    get_document_by_session,
-    get_assessment_by_session,
-    load_chat_history,
+    load_full_practice_session,
     create_practice_session,
-    get_session_by_id,
 )
+from app.db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.chat_buffer import chat_buffer
 from app.db import schemas
 
 router = APIRouter()
@@ -32,34 +32,80 @@ async def new_session(user_id: int):
 
 
 @router.get("/sessions/{user_id}", response_model=schemas.PracticeSessions)
-async def get_sessions(user_id: int):
-    """Retrieve all practice sessions for a given user."""
+async def get_sessions(
+    user_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+):
+    """Retrieve a page of practice sessions for a given user, newest first.
+    Args:
+        user_id (int): The owner of the sessions.
+        limit (int): Page size.
+        cursor (str | None): next_cursor of the previous page.
+    Returns:
+        PracticeSessions: The sessions and the cursor of the next page.
+    """
     try:
-        practice_sessions = await load_practice_sessions(user_id)
+        practice_sessions, next_cursor = await load_practice_sessions(
+            user_id, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to load practice sessions: {str(e)}"
         )
-    return {"sessions": practice_sessions}
+    return {"sessions": practice_sessions, "next_cursor": next_cursor}
 
 
 @router.get("/session/{session_id}", response_model=schemas.FullPracticeSession)
-async def get_session(session_id: int):
-    """Retrieve a specific practice session by session ID, including document, assessment, and messages."""
+async def get_session(
+    session_id: int,
+    message_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Retrieve a specific practice session by session ID, including document,
+    assessment, and the latest messages. Older messages are paged through
+    GET /session/{session_id}/messages."""
     try:
-        session_exists = await get_session_by_id(session_id)
-        if not session_exists:
-            raise HTTPException(status_code=404, detail="Session not found.")
-        document = await get_document_by_session(session_id)
-        assessment = await get_assessment_by_session(session_id)
-        messages = await load_chat_history(session_id)
-    except HTTPException:
-        raise
+        # Make buffered chat messages visible before reading them back
+        await chat_buffer.sync(session_id)
+        practice_session, messages, messages_cursor = (
+            await load_full_practice_session(session_id, message_limit)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load session: {str(e)}")
+    if not practice_session:
+        raise HTTPException(status_code=404, detail="Session not found.")
     return {
         "id": session_id,
-        "document": document,
-        "assessment": assessment,
+        "document": practice_session.document,
+        "assessment": practice_session.assessment,
         "chat_messages": messages,
+        "messages_cursor": messages_cursor,
     }
+
+
+@router.get("/session/{session_id}/messages", response_model=schemas.ChatMessages)
+async def get_session_messages(
+    session_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: str | None = None,
+):
+    """Retrieve a page of chat messages, walking back in time.
+    Args:
+        session_id (int): The session of the messages.
+        limit (int): Page size.
+        before (str | None): messages_cursor or next_cursor of the newer page.
+    Returns:
+        ChatMessages: Messages in chronological order and the cursor of older ones.
+    """
+    try:
+        await chat_buffer.sync(session_id)
+        messages, next_cursor = await load_chat_page(session_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to load messages: {str(e)}"
+        )
+    return {"messages": messages, "next_cursor": next_cursor}
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.db.queries import save_uploaded_document
-from app.services.document_service import process_uploaded_document, save_document
+import logging
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from app.db.queries import get_document_by_session, save_uploaded_document
+from app.services.document_service import extract_document_text, save_document
+from app.services.job_service import job_queue
+from app.services.prefetch_service import PREFETCH_ON_UPLOAD, prefetch_payload
+from app.services.retrieval_service import index_document
+from app.services.text_store import get_document_content, text_metadata
 from app.db import schemas
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Largest text range served per request, in characters
+MAX_TEXT_RANGE = 256 * 1024
+
 
 @router.post("/upload/{session_id}", response_model=schemas.DocumentBase)
 async def upload_document(session_id: int, file: UploadFile = File(...)):
@@ -25,8 +35,16 @@ async def upload_document(session_id: int, file: UploadFile = File(...)):
         )
 
     try:
-        # Process the uploaded document to extract and clean text
-        content = process_uploaded_document(file)
+        # Stream the file to storage once, hashing it on the way
+        (file_path, filename, content_hash, size) = await save_document(file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+
+    try:
+        # Extract and clean text, reusing earlier extractions of identical files
+        content = await extract_document_text(
+            file_path, str(file.content_type), content_hash
+        )
         if not content or not content.strip():
             raise HTTPException(
                 status_code=400, detail="Failed to extract text from the document."
@@ -40,26 +58,70 @@ async def upload_document(session_id: int, file: UploadFile = File(...)):
 
     doc_metadata = {
         "content_type": file.content_type,
-        "size": getattr(file, "size", None),
+        "size": size,
+        "sha256": content_hash,
+        # The text itself is stored compressed under the content hash
+        **text_metadata(content),
     }
 
-    try:
-        # Save the file to storage and get the document metadata
-        (file_path, filename) = await save_document(file)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-
     try:
         id = await save_uploaded_document(
-            session_id, file_path, filename, content=content, doc_metadata=doc_metadata
+            session_id, file_path, filename, content=None, doc_metadata=doc_metadata
         )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Failed to save document: {str(e)}"
         )
 
+    try:
+        # Split the text into passages and index them for chat and grading
+        await index_document(id, content, content_hash)
+    except Exception as e:
+        # Not fatal: the index is rebuilt on first retrieval
+        logger.warning("Document indexing error: %s", e)
+
+    if PREFETCH_ON_UPLOAD:
+        try:
+            # Summarize and draft assessments before the user clicks Generate
+            await job_queue.submit("prefetch", session_id, prefetch_payload())
+        except Exception as e:
+            # Not fatal: generation then starts from the raw text
+            logger.warning("Prefetch scheduling error: %s", e)
+
     return {
         "id": id,
         "filename": filename,
         "path": file_path,
     }
+
+
+@router.get("/document/{session_id}/text", response_model=schemas.DocumentTextRange)
+async def get_document_text_range(
+    session_id: int,
+    offset: int = Query(0, ge=0),
+    length: int = Query(MAX_TEXT_RANGE, ge=1, le=MAX_TEXT_RANGE),
+):
+    """Retrieve a character range of a session document's extracted text.
+    Args:
+        session_id (int): The session the document belongs to.
+        offset (int): First character to return.
+        length (int): Maximum number of characters to return.
+    Returns:
+        DocumentTextRange: The text range and the total text length.
+    """
+    try:
+        document = await get_document_by_session(session_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Document not found.")
+        text = await get_document_content(document, offset, length)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to load document text: {str(e)}"
+        )
+    return {
+        "offset": offset,
+        "text": text,
+        "text_length": document.text_length,
+    }
@@ -0,0 +1,146 @@
+# Bulk generation and grading for a whole class, streamed back item by item
+from typing import AsyncIterator, Awaitable, Callable
+from sqlalchemy.exc import IntegrityError
+from app.ai.resilience import AIProviderError
+from app.services.job_service import run_generate_job, run_grade_job
+from app.services.singleflight import SingleFlight
+from app.services.text_store import get_document_content
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Items of one bulk request processed at a time
+BULK_MAX_CONCURRENCY = int(os.getenv("BULK_MAX_CONCURRENCY", "8"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "500"))
+
+
+class DocumentTextCache:
+    """
+    Document text shared by the items of one bulk request. Sessions created
+    from the same syllabus have the same content hash, so its text is read
+    and decompressed once instead of once per session.
+    """
+
+    def __init__(self):
+        self._texts: dict[str, str] = {}
+        self._loads = SingleFlight()
+
+    async def get(self, document) -> str:
+        key = document.content_hash or f"document:{document.id}"
+        text = self._texts.get(key)
+        if text is None:
+            text = await self._loads.do(key, lambda: get_document_content(document))
+            self._texts[key] = text
+        return text
+
+
+def client_error(error: BaseException, duplicate: str, fallback: str) -> str:
+    """
+    Short, stable message of a failed item for the bulk response. Job errors
+    wrap the original exception, whose text may contain SQL or provider
+    details, so only its type is looked at.
+    Args:
+        error (BaseException): The item's error.
+        duplicate (str): Message when a stored row already existed.
+        fallback (str): Message for any other error.
+    Returns:
+        str: The message sent to the client.
+    """
+    while error is not None:
+        if isinstance(error, IntegrityError):
+            return duplicate
+        if isinstance(error, AIProviderError):
+            return "AI model unavailable, try again later"
+        error = error.__cause__ or error.__context__
+    return fallback
+
+
+async def run_bulk(
+    items: list, run: Callable[[object], Awaitable[dict]], concurrency: int
+) -> AsyncIterator[dict]:
+    """
+    Run items with bounded concurrency and yield their results as they finish.
+    If the consumer stops early (e.g. the client disconnected), the remaining
+    items are cancelled.
+    Args:
+        items (list): Work items.
+        run: Coroutine function producing the result dict of one item; it
+            reports failures in the result instead of raising.
+        concurrency (int): Items running at a time.
+    Yields:
+        dict: Item results in completion order.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def run_item(item):
+        async with semaphore:
+            results.put_nowait(await run(item))
+
+    tasks = [asyncio.create_task(run_item(item)) for item in items]
+    try:
+        for _ in tasks:
+            yield await results.get()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def bulk_generate(
+    session_ids: list[int],
+    payload: dict,
+    concurrency: int = BULK_MAX_CONCURRENCY,
+) -> AsyncIterator[dict]:
+    """
+    Generate and store assessments for many sessions.
+    Args:
+        session_ids (list[int]): Sessions to generate for.
+        payload (dict): Generation settings shared by every session, as for
+            a single generate job.
+        concurrency (int): Sessions generated at a time.
+    Yields:
+        dict: {"session_id", "status": "succeeded", "assessment"} or
+            {"session_id", "status": "failed", "error"} per session.
+    """
+    texts = DocumentTextCache()
+
+    async def run(session_id: int) -> dict:
+        try:
+            assessment = await run_generate_job(session_id, payload, texts.get)
+        except Exception as e:
+            logger.warning("Bulk generation failed for session %s: %s", session_id, e)
+            error = client_error(e, "assessment already exists", "generation failed")
+            return {"session_id": session_id, "status": "failed", "error": error}
+        return {"session_id": session_id, "status": "succeeded", "assessment": assessment}
+
+    async for result in run_bulk(session_ids, run, concurrency):
+        yield result
+
+
+async def bulk_grade(
+    items: list[dict], concurrency: int = BULK_MAX_CONCURRENCY
+) -> AsyncIterator[dict]:
+    """
+    Grade the answers of many sessions and store feedback and scores.
+    Args:
+        items (list[dict]): {"session_id", "user_answer"} per session.
+        concurrency (int): Sessions graded at a time.
+    Yields:
+        dict: {"session_id", "status", "assessment" | "error"} per session.
+    """
+
+    async def run(item: dict) -> dict:
+        session_id = item["session_id"]
+        try:
+            assessment = await run_grade_job(session_id, item)
+        except Exception as e:
+            logger.warning("Bulk grading failed for session %s: %s", session_id, e)
+            error = client_error(e, "feedback already exists", "grading failed")
+            return {"session_id": session_id, "status": "failed", "error": error}
+        return {"session_id": session_id, "status": "succeeded", "assessment": assessment}
+
+    async for result in run_bulk(items, run, concurrency):
+        yield result
@@ -0,0 +1,170 @@
+# Write-behind buffer that batches chat message inserts off the chat latency path
+from sqlalchemy.exc import IntegrityError
+from app.db.models import utcnow
+from app.db.queries import save_chat_messages
+from app.metrics import Counter, background_errors
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CHAT_FLUSH_INTERVAL_SECONDS = float(os.getenv("CHAT_FLUSH_INTERVAL_SECONDS", "0.5"))
+CHAT_FLUSH_MAX_BATCH = int(os.getenv("CHAT_FLUSH_MAX_BATCH", "100"))
+# Failed flushes in a row before the buffered messages are dropped
+CHAT_FLUSH_MAX_ATTEMPTS = int(os.getenv("CHAT_FLUSH_MAX_ATTEMPTS", "20"))
+
+dropped_messages = Counter(
+    "chat_messages_dropped_total", "Chat messages dropped because they could not be stored"
+)
+
+
+class ChatMessageBuffer:
+    """
+    Collects chat messages in memory and inserts them in one transaction per
+    flush interval, or as soon as a batch is full.
+    Messages are timestamped when added, so their order is kept however they
+    are batched. Readers call sync() first to see their own writes.
+    A batch the database rejects (e.g. for a deleted session) is retried
+    session by session and only the rejected sessions' messages are dropped;
+    other failures are retried up to max_attempts flushes in a row.
+    """
+
+    def __init__(
+        self,
+        interval: float = CHAT_FLUSH_INTERVAL_SECONDS,
+        max_batch: int = CHAT_FLUSH_MAX_BATCH,
+        max_attempts: int = CHAT_FLUSH_MAX_ATTEMPTS,
+    ):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self._failures = 0
+        self._pending: list[dict] = []
+        # Messages taken by a flush that has not committed yet
+        self._in_flight: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write everything still buffered."""
+        if self._task is not None:
+            # Let a flush in progress commit instead of cancelling it
+            self._stopping = True
+            self._full.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def add(self, user_id: int, session_id: int, message: str, sender: str):
+        """
+        Buffer a chat message for the next flush.
+        Args:
+            user_id (int): The sender's user ID.
+            session_id (int): The session the message belongs to.
+            message (str): Message text.
+            sender (str): 'user' or 'bot'.
+        """
+        self._pending.append(
+            {
+                "user_id": user_id,
+                "session_id": session_id,
+                "message": message,
+                "sender": sender,
+                "created_at": utcnow(),
+            }
+        )
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+
+    async def flush(self):
+        """Write all buffered messages in one transaction."""
+        async with self._lock:
+            if not self._pending:
+                return
+            self._in_flight, self._pending = self._pending, []
+            try:
+                await save_chat_messages(self._in_flight)
+            except asyncio.CancelledError:
+                # The caller went away, the batch still has to be written
+                self._pending = self._in_flight + self._pending
+                raise
+            except IntegrityError:
+                # Permanent for the offending rows, so retrying the batch won't help
+                self._failures = 0
+                await self._save_by_session(self._in_flight)
+            except Exception:
+                self._failures += 1
+                if self._failures >= self.max_attempts:
+                    self._failures = 0
+                    self._drop(self._in_flight, "failed to flush repeatedly")
+                else:
+                    # Keep the batch for the next flush, ahead of newer messages
+                    self._pending = self._in_flight + self._pending
+                raise
+            else:
+                self._failures = 0
+            finally:
+                self._in_flight = []
+
+    async def _save_by_session(self, messages: list[dict]):
+        sessions: dict[int, list[dict]] = {}
+        for message in messages:
+            sessions.setdefault(message["session_id"], []).append(message)
+        groups = list(sessions.values())
+        for i, session_messages in enumerate(groups):
+            try:
+                await save_chat_messages(session_messages)
+            except IntegrityError as e:
+                self._drop(session_messages, f"rejected by the database: {e}")
+            except BaseException:
+                # Not these sessions' fault (or cancelled), keep them for the next flush
+                self._pending = [m for group in groups[i:] for m in group] + self._pending
+                raise
+
+    def _drop(self, messages: list[dict], reason: str):
+        dropped_messages.inc(amount=len(messages))
+        sessions = sorted({message["session_id"] for message in messages})
+        logger.error(
+            "Dropped %d chat messages of sessions %s, %s", len(messages), sessions, reason
+        )
+
+    def pending(self, session_id: int) -> int:
+        """Number of the session's messages that are not committed yet."""
+        return sum(
+            1
+            for message in (*self._in_flight, *self._pending)
+            if message["session_id"] == session_id
+        )
+
+    async def sync(self, session_id: int):
+        """Flush if the session has messages that are not committed yet."""
+        if self.pending(session_id):
+            try:
+                await self.flush()
+            except Exception as e:
+                # Readers still get the committed history
+                background_errors.inc(("chat_buffer",))
+                logger.warning("Chat message flush error: %s", e)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                background_errors.inc(("chat_buffer",))
+                logger.warning("Chat message flush error: %s", e)
+
+
+chat_buffer = ChatMessageBuffer()
@@ -0,0 +1,117 @@
+# Bounded conversation memory: recent turns verbatim, older turns as a rolling summary
+from app.ai.provider import AIProvider
+from app.db.queries import (
+    count_chat_messages_after,
+    get_chat_summary,
+    load_chat_messages_after,
+    save_chat_summary,
+)
+from app.metrics import background_errors
+from app.services.chat_buffer import chat_buffer
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+provider = AIProvider()
+
+# Turns (a student message and the reply) always sent verbatim
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "4"))
+# Turns that may pile up past the window before they are folded into the summary,
+# so the summary is recomputed once every few turns instead of on every turn
+CHAT_SUMMARY_EVERY_TURNS = int(os.getenv("CHAT_SUMMARY_EVERY_TURNS", "4"))
+
+
+class ChatMemory:
+    """
+    Builds the conversation context of a chat turn.
+    Messages after the summary are sent verbatim. Once turns + every_turns
+    turns have accumulated, all but the latest turns are folded into the
+    session's summary in the background.
+    """
+
+    def __init__(
+        self, turns: int = CHAT_MEMORY_TURNS, every_turns: int = CHAT_SUMMARY_EVERY_TURNS
+    ):
+        self.keep = turns * 2
+        self.max_verbatim = (turns + every_turns) * 2
+        self._folding: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def get_context(self, session_id: int) -> tuple[str | None, list[dict]]:
+        """
+        Return the conversation summary and the turns after it.
+        Args:
+            session_id (int): The chat session.
+        Returns:
+            tuple[str | None, list[dict]]: The summary, None before the first
+                fold, and the recent messages as {"sender", "message"} dicts.
+        """
+        await chat_buffer.sync(session_id)
+        summary = await get_chat_summary(session_id)
+        messages = await load_chat_messages_after(
+            session_id, self._position(summary), self.max_verbatim, newest=True
+        )
+        return (
+            str(summary.summary) if summary else None,
+            [{"sender": m.sender, "message": m.message} for m in messages],
+        )
+
+    def schedule_fold(self, session_id: int):
+        """Fold older turns into the summary in the background, if due."""
+        if session_id in self._folding:
+            return
+        self._folding.add(session_id)
+        task = asyncio.create_task(self._fold(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, session_id: int):
+        try:
+            summary = await get_chat_summary(session_id)
+            position = self._position(summary)
+            # Count buffered messages too, so the buffer is only flushed for a fold
+            unfolded = await count_chat_messages_after(
+                session_id, position
+            ) + chat_buffer.pending(session_id)
+            if unfolded < self.max_verbatim:
+                return
+            await chat_buffer.sync(session_id)
+            # Load at most two windows, a long backlog is caught up over several folds
+            messages = await load_chat_messages_after(
+                session_id, position, self.max_verbatim * 2
+            )
+            if len(messages) < self.max_verbatim:
+                return
+            folded = messages[: len(messages) - self.keep]
+            result = await provider.execute_async(
+                "summarize_chat",
+                {
+                    "summary": summary.summary if summary else None,
+                    "turns": [
+                        {"sender": m.sender, "message": m.message} for m in folded
+                    ],
+                },
+                use_cache=False,
+            )
+            text = result.get("summary")
+            if not text:
+                return
+            await save_chat_summary(
+                session_id, text, folded[-1].created_at, int(folded[-1].id)
+            )
+        except Exception as e:
+            background_errors.inc(("chat_memory",))
+            logger.exception("Chat summary error for session %s: %s", session_id, e)
+        finally:
+            self._folding.discard(session_id)
+
+    @staticmethod
+    def _position(summary):
+        if summary is None or summary.last_message_id is None:
+            return None
+        return summary.last_created_at, int(summary.last_message_id)
+
+
+chat_memory = ChatMemory()
@@ -0,0 +1,44 @@
+# Splits cleaned document text into token-bounded, overlapping chunks
+from app.ai.tokens import estimate_tokens, tokens_to_chars
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """
+    Split text into chunks of at most max_tokens, overlapping by overlap_tokens.
+    Cuts prefer sentence ends, then word boundaries, in the second half of a window.
+    Args:
+        text (str): Cleaned text, as returned by process_uploaded_document
+        max_tokens (int): Upper bound on the estimated tokens per chunk
+        overlap_tokens (int): Estimated tokens repeated at the start of the next chunk
+    Returns:
+        list[str]: Chunks in document order
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    max_chars = tokens_to_chars(max_tokens)
+    overlap_chars = min(tokens_to_chars(overlap_tokens), max_chars // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Snap the cut back to a sentence end, or at least a word boundary
+            floor = start + max_chars // 2
+            cut = text.rfind(". ", floor, end)
+            if cut == -1:
+                cut = text.rfind(" ", floor, end)
+            if cut != -1:
+                end = cut + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+
+        # Step back by the overlap and move forward to the next word start
+        next_start = max(end - overlap_chars, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
@@ -1,28 +1,45 @@
 from typing import Optional
 from fastapi import UploadFile
 from app.ai.provider import AIProvider
+from app.ai.tokens import estimate_tokens, trim_to_tokens
+from app.db.queries import get_document_summary, save_document_summary
+from app.services.chunking import chunk_text
+from app.services.pdf_extraction import extract_text_from_pdf_file
+from app.services.text_store import load_text, store_text
+import aiofiles
+import aiofiles.os
+import asyncio
+import hashlib
+import logging
 import re
-import PyPDF2
 import os
+import uuid
+
+logger = logging.getLogger(__name__)
 
 provider = AIProvider()
 
+# Map-reduce summarization settings for documents larger than one prompt
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000"))
+SUMMARY_CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "200"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "8"))
+SUMMARY_MAX_REDUCE_ROUNDS = 3
+# Size of the document summary given to the chat tutor as an overview
+CHAT_OVERVIEW_TOKENS = int(os.getenv("CHAT_OVERVIEW_TOKENS", "600"))
+
+UPLOAD_DIR = "uploaded_docs"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def extract_text_from_pdf(file: UploadFile) -> str:
-    # Reset file pointer to ensure complete read
-    file.file.seek(0)
-    reader = PyPDF2.PdfReader(file.file)
-    text = ""
-    for page in reader.pages:
-        # Concatenate text from each page, handling empty pages gracefully
-        text += page.extract_text() or ""
-    return text
 
+async def extract_text_from_pdf(file_path: str) -> str:
+    # Parsing runs in a worker process with a page cap and timeout
+    return await extract_text_from_pdf_file(file_path)
 
-def extract_text_from_txt(file: UploadFile) -> str:
-    # Reset file pointer and decode with error handling for malformed UTF-8
-    file.file.seek(0)
-    return file.file.read().decode("utf-8", errors="ignore")
+
+async def extract_text_from_txt(file_path: str) -> str:
+    # Decode with error handling for malformed UTF-8
+    async with aiofiles.open(file_path, "rb") as stored:
+        return (await stored.read()).decode("utf-8", errors="ignore")
 
 
 def clean_text(text: str) -> str:
@@ -32,31 +49,61 @@ def clean_text(text: str) -> str:
     return text
 
 
-def process_uploaded_document(file: UploadFile) -> Optional[str]:
+async def process_uploaded_document(file: UploadFile) -> Optional[str]:
     """
     Extract and clean text from an uploaded document (PDF or TXT).
+    The file is stored under its content hash first, so repeated uploads
+    reuse the text extracted the first time.
     Args:
         file (UploadFile): The uploaded file object.
     Returns:
         Optional[str]: Cleaned text content if extraction is successful, None otherwise.
     """
+    (file_path, _, content_hash, _) = await save_document(file)
+    return await extract_document_text(
+        file_path, str(file.content_type), content_hash
+    )
+
+
+async def extract_document_text(
+    file_path: str, content_type: str, content_hash: str
+) -> Optional[str]:
+    """
+    Return the cleaned text of a stored document, extracting it only if no
+    upload with the same content hash was extracted before.
+    Args:
+        file_path (str): Path of the stored file.
+        content_type (str): MIME type of the file.
+        content_hash (str): SHA-256 of the file contents.
+    Returns:
+        Optional[str]: Cleaned text content if extraction is successful, None otherwise.
+    """
+    cached = await load_text(content_hash)
+    if cached is not None:
+        return cached
+
     # Handle different file types with appropriate extractors
-    if file.content_type == "application/pdf":
+    if content_type == "application/pdf":
         try:
-            text = extract_text_from_pdf(file)
+            text = await extract_text_from_pdf(file_path)
         except Exception as e:
-            print(f"PDF extraction error: {e}")
+            logger.warning("PDF extraction error: %s", e)
             return None
-    elif file.content_type == "text/plain":
+    elif content_type == "text/plain":
         try:
-            text = extract_text_from_txt(file)
+            text = await extract_text_from_txt(file_path)
         except Exception as e:
-            print(f"TXT extraction error: {e}")
+            logger.warning("TXT extraction error: %s", e)
             return None
     else:
-        print(f"Unsupported file type: {file.content_type}")
+        logger.warning("Unsupported file type: %s", content_type)
         return None
-    return clean_text(text)
+    # Whitespace normalization over megabytes of text is CPU work
+    text = await asyncio.to_thread(clean_text, text)
+
+    if text:
+        await store_text(content_hash, text)
+    return text
 
 
 async def summarize_document(file: UploadFile) -> Optional[dict]:
@@ -67,40 +114,130 @@ async def summarize_document(file: UploadFile) -> Optional[dict]:
     Returns:
         Optional[dict]: Summary of the document content if successful, None otherwise.
     """
-    text = process_uploaded_document(file)
+    text = await process_uploaded_document(file)
     if not text:
         return None
 
     # Summarize the cleaned text using AI provider
-    summary = provider.execute(
-        "summarize",
-        data={
-            "content": text,
-        },
-    )
+    summary = await summarize_text(text)
 
     return {**summary, "content": text}
 
 
-async def save_document(file: UploadFile) -> tuple[str, str]:
+async def summarize_text(text: str) -> dict:
     """
-    Save the file to storage and return file path.
+    Summarize text of any length with a map-reduce over token-bounded chunks.
+    Chunks are summarized concurrently (at most SUMMARY_MAX_CONCURRENCY at a
+    time) and the partial summaries are reduced into one SummaryResponse.
+    Args:
+        text (str): Cleaned document text.
+    Returns:
+        dict: {"summary": str, "keyword": str}
+    """
+    chunks = chunk_text(text, SUMMARY_CHUNK_TOKENS, SUMMARY_CHUNK_OVERLAP_TOKENS)
+    if len(chunks) <= 1:
+        return await provider.execute_async("summarize", data={"content": text})
+
+    partials = await _summarize_chunks(chunks)
+
+    # Collapse partial summaries until they fit into a single reduce prompt
+    for _ in range(SUMMARY_MAX_REDUCE_ROUNDS):
+        if estimate_tokens("".join(partials)) <= SUMMARY_CHUNK_TOKENS:
+            break
+        partials = await _summarize_chunks(
+            chunk_text("\n\n".join(partials), SUMMARY_CHUNK_TOKENS)
+        )
+
+    return await provider.execute_async("summarize", data={"sections": partials})
+
+
+async def summarize_stored_document(content_hash: str, text: str) -> dict:
+    """
+    Summary of a stored document, summarized once per content hash.
+    Args:
+        content_hash (str): SHA-256 of the uploaded file.
+        text (str): The document's cleaned text.
+    Returns:
+        dict: {"summary": str, "keyword": str}
+    """
+    stored = await get_document_summary(content_hash)
+    if stored is not None:
+        return {"summary": str(stored.summary), "keyword": str(stored.keyword)}
+    summary = await summarize_text(text)
+    # An empty fallback summary is not stored, so the next upload tries again
+    if summary.get("summary"):
+        await save_document_summary(
+            content_hash, summary["summary"], summary.get("keyword", "")
+        )
+    return summary
+
+
+async def get_document_overview(document) -> Optional[str]:
+    """
+    The stored summary of a document, shortened to CHAT_OVERVIEW_TOKENS,
+    or None until it has been summarized. Never calls the provider.
+    """
+    if not document.content_hash:
+        return None
+    stored = await get_document_summary(document.content_hash)
+    if stored is None or not stored.summary:
+        return None
+    return trim_to_tokens(str(stored.summary), CHAT_OVERVIEW_TOKENS)
+
+
+async def _summarize_chunks(chunks: list[str]) -> list[str]:
+    # Bounded fan-out keeps large documents from flooding the provider
+    semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+
+    async def summarize_chunk(chunk: str) -> str:
+        async with semaphore:
+            result = await provider.execute_async(
+                "summarize_chunk", data={"content": chunk}
+            )
+        return result.get("summary", "")
+
+    partials = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+    return [partial for partial in partials if partial]
+
+
+async def save_document(file: UploadFile) -> tuple[str, str, str, int]:
+    """
+    Stream the file to storage in a single pass, hashing it on the way.
+    Files are stored under their SHA-256, so identical uploads share one
+    file and different files with the same name never overwrite each other.
     Args:
         file (UploadFile): The uploaded file object.
     Returns:
-        tuple[str, str]: Tuple containing the file path and filename.
+        tuple[str, str, str, int]: The file path, original filename,
+            SHA-256 hex digest and size in bytes.
     """
-    upload_dir = "uploaded_docs"
-    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
     filename = file.filename or "uploaded_file"
-    file_path = os.path.join(upload_dir, filename)
-
-    # Save the uploaded file to disk
-    with open(file_path, "wb") as out_file:
-        while True:
-            chunk = await file.read(1024 * 1024)
-            if not chunk:
-                break
-            out_file.write(chunk)
+    extension = os.path.splitext(filename)[1].lower()
+    temp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    await file.seek(0)
+    try:
+        async with aiofiles.open(temp_path, "wb") as out_file:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await out_file.write(chunk)
+    except BaseException:
+        await aiofiles.os.remove(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    file_path = os.path.join(UPLOAD_DIR, f"{content_hash}{extension}")
+    if await aiofiles.os.path.exists(file_path):
+        # Same content already stored
+        await aiofiles.os.remove(temp_path)
+    else:
+        await aiofiles.os.replace(temp_path, file_path)
 
-    return (file_path, filename)
+    return (file_path, filename, content_hash, size)
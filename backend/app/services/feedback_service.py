@@ -1,18 +1,41 @@
-from app.db.queries import get_assessment_by_session, get_document_by_session
+from app.db.queries import (
+    get_assessment_by_session,
+    get_document_by_session,
+    get_mcq_explanations,
+    save_mcq_explanations,
+)
 from app.ai.provider import AIProvider
+from app.ai.resilience import AIProviderError
+from app.services.retrieval_service import retrieve_passages
 from app.db.schemas import FeedbackWithScore
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 provider = AIProvider()
 
 
-def mcq_feedback(
-    questions: list[str], user_answers: list[str], correct_answers: list[str]
+def explanation_key(question: str, user_answer: str, correct_answer: str) -> str:
+    """Cache key of the explanation for one wrong answer to one question"""
+    payload = json.dumps([question, user_answer, correct_answer])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def mcq_feedback(
+    questions: list[str],
+    user_answers: list[str],
+    correct_answers: list[str],
+    explanations: list[dict] | None = None,
 ) -> FeedbackWithScore:
     """Generate feedback and score for multiple-choice questions (MCQ).
     Args:
         questions (list[str]): List of question texts.
         user_answers (list[str]): List of user's answers.
         correct_answers (list[str]): List of correct answers.
+        explanations (list[dict] | None): Explanations precomputed at generation
+            time for each question, with 'explanation' and 'distractor_explanations'.
     Returns:
         FeedbackWithScore: An object containing feedback and score.
     """
@@ -30,28 +53,80 @@ def mcq_feedback(
         if user_answer == correct_answer
     )
 
-    # Generate detailed AI feedback for each answer
-    ai_feedback = provider.execute(
-        "grade_mcq",
-        {
-            "questions": questions,
-            "user_answers": user_answers,
-            "correct_answers": correct_answers,
-        },
-    )
+    precomputed = explanations or [{} for _ in questions]
+    feedback: list[str] = [
+        f"Correct! {correct_answer} is the right answer."
+        + (f" {item['explanation']}" if item.get("explanation") else "")
+        for correct_answer, item in zip(correct_answers, precomputed)
+    ]
+    wrong: list[int] = []
+    for i, (user_answer, correct_answer) in enumerate(zip(user_answers, correct_answers)):
+        if user_answer == correct_answer:
+            continue
+        distractor_explanation = (
+            precomputed[i].get("distractor_explanations") or {}
+        ).get(user_answer)
+        if distractor_explanation:
+            # Answered locally from explanations stored with the assessment
+            feedback[i] = f"Incorrect. {distractor_explanation}"
+            if precomputed[i].get("explanation"):
+                feedback[i] += f" {precomputed[i]['explanation']}"
+        else:
+            wrong.append(i)
+    if not wrong:
+        return FeedbackWithScore(feedback=feedback, score=score)
+
+    # Reuse explanations given to earlier students who picked the same distractor
+    keys = {
+        i: explanation_key(questions[i], user_answers[i], correct_answers[i])
+        for i in wrong
+    }
+    cached_explanations = await get_mcq_explanations(list(set(keys.values())))
+    missing = [i for i in wrong if keys[i] not in cached_explanations]
+
+    if missing:
+        # Generate detailed AI feedback only for wrong answers not seen before
+        try:
+            ai_feedback = await provider.execute_async(
+                "grade_mcq",
+                {
+                    "questions": [questions[i] for i in missing],
+                    "user_answers": [user_answers[i] for i in missing],
+                    "correct_answers": [correct_answers[i] for i in missing],
+                },
+            )
+        except AIProviderError as e:
+            # The score doesn't depend on the model, so grade without explanations
+            logger.warning("MCQ explanation error: %s", e)
+            ai_feedback = {}
+        items = ai_feedback.get("feedback", [])
+        # Only cache explanations that line up one-to-one with the questions
+        if len(items) == len(missing):
+            generated = {keys[i]: item for i, item in zip(missing, items)}
+            await save_mcq_explanations(generated)
+            cached_explanations.update(generated)
+
+    for i in wrong:
+        feedback[i] = cached_explanations.get(
+            keys[i],
+            f"Incorrect. The correct answer is {correct_answers[i]}.",
+        )
 
-    return FeedbackWithScore(feedback=ai_feedback.get("feedback", []), score=score)
+    return FeedbackWithScore(feedback=feedback, score=score)
 
 
-def essay_feedback(essay_text, prompt, expected_answer, content) -> FeedbackWithScore:
-    # Request AI-based analysis comparing student essay against expected answer
-    ai_feedback = provider.execute(
+async def essay_feedback(
+    essay_text, prompt, expected_answer, passages: list[str]
+) -> FeedbackWithScore:
+    # Request AI-based analysis comparing student essay against expected answer,
+    # grounded only in the document passages relevant to the essay
+    ai_feedback = await provider.execute_async(
         "grade_essay",
         {
             "essay": essay_text,
             "prompt": prompt,
             "expected_answer": expected_answer,
-            "content": content,
+            "passages": passages,
         },
     )
 
@@ -77,9 +152,9 @@ async def process_assessment_feedback(
     elif str(assessment.type) == "essay":
         prompt = assessment.content.get("prompt", "")
         expected_answer = assessment.content.get("expected_answer", "")
-        content = str(document.content) or ""
+        passages = await retrieve_passages(document, f"{prompt}\n{user_answer[0]}")
         return await process_essay_feedback(
-            prompt, expected_answer, user_answer[0], content
+            prompt, expected_answer, user_answer[0], passages
         )
     else:
         raise ValueError("Unknown assessment type")
@@ -89,10 +164,19 @@ async def process_mcq_feedback(assessment, user_answers: list) -> FeedbackWithSc
     questions = assessment.content.get("questions", [])
     question_texts = [q["question"] for q in questions]
     correct_answers = [q["correct_answer"] for q in questions]
-    return mcq_feedback(question_texts, user_answers, correct_answers)
+    explanations = [
+        {
+            "explanation": q.get("explanation"),
+            "distractor_explanations": q.get("distractor_explanations"),
+        }
+        for q in questions
+    ]
+    return await mcq_feedback(
+        question_texts, user_answers, correct_answers, explanations
+    )
 
 
 async def process_essay_feedback(
-    prompt: str, expected_answer: str, essay_text: str, content: str
+    prompt: str, expected_answer: str, essay_text: str, passages: list[str]
 ) -> FeedbackWithScore:
-    return essay_feedback(essay_text, prompt, expected_answer, content)
+    return await essay_feedback(essay_text, prompt, expected_answer, passages)
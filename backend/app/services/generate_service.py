@@ -1,18 +1,42 @@
 # Service for generating assessment content using AI
-from app.db.queries import get_document_by_session, update_practice_session_title
+from app.db.queries import (
+    get_document_by_session,
+    take_assessment_draft,
+    update_practice_session_title,
+)
 from app.ai.provider import AIProvider
+from app.ai.tokens import estimate_tokens
 from app.db.schemas import EssayContent, MCQContent, MCQQuestion
+from app.services.chunking import chunk_text
+from app.services.text_store import get_document_content
+from typing import Any, Awaitable, Callable
+import asyncio
+import logging
+import math
+import os
 import random
+import re
+
+logger = logging.getLogger(__name__)
 
 provider = AIProvider()
 
+MCQ_QUESTION_COUNT = int(os.getenv("MCQ_QUESTION_COUNT", "20"))
+# Sections are at least this large, and there are at most MCQ_MAX_SECTIONS of them
+MCQ_SECTION_TOKENS = int(os.getenv("MCQ_SECTION_TOKENS", "3000"))
+MCQ_MAX_SECTIONS = int(os.getenv("MCQ_MAX_SECTIONS", "8"))
+# Extra questions requested per section to make up for removed duplicates
+MCQ_OVERSAMPLE = 1.25
+# Questions whose word sets overlap at least this much are treated as duplicates
+MCQ_DUPLICATE_SIMILARITY = 0.8
+
 
 async def generate_essay_prompt(content: str) -> EssayContent:
     """
     Generate an essay prompt and expected answer based document content.
     """
     # Request AI to generate essay question
-    generated_question = provider.execute(
+    generated_question = await provider.execute_async(
         "essay",
         {
             "content": content,
@@ -29,21 +53,57 @@ async def generate_essay_prompt(content: str) -> EssayContent:
     return essay_content
 
 
-async def generate_mcq_questions(content: str) -> MCQContent:
+async def generate_mcq_questions(
+    content: str, question_count: int | None = None, explanations: bool = False
+) -> MCQContent:
     """
     Generate MCQ questions, answers, and distractors based on Session_id.
+    The content is split into sections that are sent as concurrent smaller
+    requests, so questions cover the whole document.
+    With explanations, every option also gets a short explanation, so MCQ
+    answers can later be graded without calling the provider.
     """
-    # Generate multiple choice questions using AI
-    generated_question = provider.execute(
-        "mcq",
-        {
-            "content": content,
-        },
+    question_count = question_count or MCQ_QUESTION_COUNT
+    sections = split_into_sections(content, question_count)
+
+    # Spread the questions over the sections, front sections take the remainder
+    base, remainder = divmod(question_count, len(sections))
+    counts = [base + (1 if i < remainder else 0) for i in range(len(sections))]
+
+    # Generate multiple choice questions using AI, one request per section.
+    # A failed section only costs its questions, the others are still used
+    results = await asyncio.gather(
+        *(
+            provider.execute_async(
+                "mcq",
+                {
+                    "content": section,
+                    "count": math.ceil(count * MCQ_OVERSAMPLE),
+                    "explanations": explanations,
+                },
+            )
+            for section, count in zip(sections, counts)
+            if count > 0
+        ),
+        return_exceptions=True,
     )
-    if not generated_question:
+    for result in results:
+        # Cancellation is not a section failure, it stops the whole generation
+        if isinstance(result, asyncio.CancelledError):
+            raise result
+    errors = [result for result in results if isinstance(result, BaseException)]
+    generated = [result for result in results if not isinstance(result, BaseException)]
+    if errors and not generated:
+        raise errors[0]
+    for error in errors:
+        logger.warning("MCQ section generation error: %s", error)
+    if not any(generated):
         raise ValueError("Failed to generate MCQ questions")
 
-    questions_data = generated_question.get("questions", [])
+    questions_data = select_questions(
+        [result.get("questions", []) for result in generated if result],
+        question_count,
+    )
     if not questions_data:
         raise ValueError("No questions were generated")
 
@@ -56,6 +116,10 @@ async def generate_mcq_questions(content: str) -> MCQContent:
                 distractors=(lambda d: random.sample(d, len(d)))(
                     q.get("distractors", [])
                 ),
+                explanation=q.get("explanation") if explanations else None,
+                distractor_explanations=(
+                    _distractor_explanations(q) if explanations else None
+                ),
             )
             for q in questions_data
         ]
@@ -64,27 +128,130 @@ async def generate_mcq_questions(content: str) -> MCQContent:
     return mcq_content
 
 
+def _distractor_explanations(question: dict) -> dict[str, str] | None:
+    """
+    Key the generated explanations by option before distractors are shuffled.
+    Returns None when they don't line up with the options.
+    """
+    distractors = question.get("distractors", [])
+    explanations = question.get("distractor_explanations", [])
+    if len(distractors) != len(explanations):
+        return None
+    correct_answer = question.get("correct_answer", "")
+    return {
+        option: explanation
+        for option, explanation in zip(distractors, explanations)
+        if option != correct_answer and explanation
+    }
+
+
+def split_into_sections(content: str, question_count: int) -> list[str]:
+    """
+    Split content into at most MCQ_MAX_SECTIONS (and at most question_count)
+    contiguous sections of roughly equal size.
+    """
+    max_sections = max(1, min(MCQ_MAX_SECTIONS, question_count))
+    section_tokens = max(
+        MCQ_SECTION_TOKENS, math.ceil(estimate_tokens(content) / max_sections)
+    )
+    sections = chunk_text(content, section_tokens)
+    # Word-boundary snapping can leave one extra small section; fold it back
+    while len(sections) > max_sections:
+        tail = sections.pop()
+        sections[-1] = f"{sections[-1]} {tail}"
+    return sections or [content]
+
+
+def _question_words(question: dict) -> set[str]:
+    return set(re.findall(r"[a-z0-9]+", str(question.get("question", "")).lower()))
+
+
+def select_questions(per_section: list[list[dict]], question_count: int) -> list[dict]:
+    """
+    Drop near-duplicate questions and pick question_count of the rest,
+    taking them round-robin across sections to keep coverage even.
+    Args:
+        per_section (list[list[dict]]): Generated questions of each section.
+        question_count (int): Number of questions to return.
+    Returns:
+        list[dict]: Selected questions.
+    """
+    selected: list[dict] = []
+    seen: list[set[str]] = []
+    queues = [list(questions) for questions in per_section]
+    while len(selected) < question_count and any(queues):
+        for queue in queues:
+            if not queue or len(selected) >= question_count:
+                continue
+            question = queue.pop(0)
+            words = _question_words(question)
+            if not words:
+                continue
+            # Jaccard similarity against every question kept so far
+            if any(
+                len(words & other) / len(words | other) >= MCQ_DUPLICATE_SIMILARITY
+                for other in seen
+            ):
+                continue
+            selected.append(question)
+            seen.append(words)
+    return selected
+
+
+def draft_settings(
+    assessment_type: str, question_count: int | None = None, explanations: bool = False
+) -> dict:
+    """Settings a draft must have been generated with to serve a request."""
+    if assessment_type == "mcq":
+        return {
+            "question_count": question_count or MCQ_QUESTION_COUNT,
+            "explanations": explanations,
+        }
+    return {}
+
+
 async def generate_question(
-    session_id: int, assessment_type: str
+    session_id: int,
+    assessment_type: str,
+    question_count: int | None = None,
+    explanations: bool = False,
+    load_content: Callable[[Any], Awaitable[str]] | None = None,
 ) -> EssayContent | MCQContent:
     """
     Generate content based on the session ID and type.
+    load_content reads the document text, get_document_content by default;
+    bulk generation passes a loader shared by sessions with the same document.
+    A draft prefetched at upload time with the same settings is used instead
+    of generating.
     """
     # retrieve document content for the session
     document = await get_document_by_session(session_id)
     if not document:
         raise ValueError("Document not found for the given session ID")
-    elif document.content is None or document.content.strip() == "":
-        raise ValueError("Document content is empty")
-
     # update session title
     await update_practice_session_title(
         session_id=session_id, title=f"{document.filename} - {assessment_type}"
     )
 
+    draft = await take_assessment_draft(
+        session_id,
+        assessment_type,
+        draft_settings(assessment_type, question_count, explanations),
+    )
+    if draft is not None:
+        if assessment_type == "essay":
+            return EssayContent.model_validate(draft)
+        return MCQContent.model_validate(draft)
+
+    content = await (load_content or get_document_content)(document)
+    if content.strip() == "":
+        raise ValueError("Document content is empty")
+
     if assessment_type == "essay":
-        return await generate_essay_prompt(str(document.content))
+        return await generate_essay_prompt(content)
     elif assessment_type == "mcq":
-        return await generate_mcq_questions(str(document.content))
+        return await generate_mcq_questions(
+            content, question_count, explanations
+        )
     else:
         raise ValueError("Unknown generation type. Use 'essay' or 'mcq'.")
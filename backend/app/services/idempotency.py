@@ -0,0 +1,62 @@
+# Idempotency-Key support: replay the stored response of a repeated request
+from typing import Awaitable, Callable
+from app.db.queries import get_idempotency_record, save_idempotency_record
+from app.services.singleflight import SingleFlight
+import datetime
+import hashlib
+import json
+import os
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+
+_inflight = SingleFlight()
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body."""
+
+
+async def run_idempotent(
+    idempotency_key: str | None,
+    scope: str,
+    payload: dict,
+    call: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Run call once per idempotency key and replay its response to repeats.
+    Only successful responses are stored; a failed call can be retried with
+    the same key. Concurrent repeats wait for the first call.
+    Args:
+        idempotency_key (str | None): The Idempotency-Key header, None to just run call.
+        scope (str): Endpoint the key belongs to, e.g. 'POST /generate/1'.
+        payload (dict): Request body, repeats must send the same one.
+        call: Coroutine function producing the JSON-serializable response.
+    Returns:
+        dict: The response of the first request with this key.
+    Raises:
+        IdempotencyConflict: If the key was used with a different body.
+    """
+    if not idempotency_key:
+        return await call()
+
+    key = f"{scope} {idempotency_key}"
+    request_hash = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+    async def run() -> dict:
+        record = await get_idempotency_record(key)
+        if record is not None:
+            if record.request_hash != request_hash:
+                raise IdempotencyConflict(
+                    "Idempotency-Key was already used with a different request"
+                )
+            return record.response
+        response = await call()
+        expires_at = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        ) + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+        await save_idempotency_record(key, request_hash, response, expires_at)
+        return response
+
+    return await _inflight.do((key, request_hash), run)
@@ -0,0 +1,339 @@
+# In-process background jobs for long-running LLM work, persisted in the jobs table
+from typing import Any, AsyncIterator, Awaitable, Callable
+from app.db.queries import (
+    claim_job,
+    create_assessment,
+    create_job,
+    find_active_job,
+    finish_job,
+    get_job,
+    get_queued_jobs,
+    renew_job_lease,
+    requeue_expired_jobs,
+    update_assessment,
+)
+from app.db import schemas
+from app.db.models import utcnow
+from app.metrics import CallbackMetric, Counter, background_errors
+from app.services.feedback_service import process_assessment_feedback
+from app.services.generate_service import generate_question
+from app.services.prefetch_service import prefetch_session
+from app.services.singleflight import SingleFlight
+import asyncio
+import datetime
+import json
+import logging
+import os
+import socket
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# How often subscribers re-read a job, in case another replica runs it
+JOB_POLL_INTERVAL_SECONDS = 1.0
+# A running job is renewed a few times per lease; once its lease expires,
+# e.g. because its replica died, any replica requeues it
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+FINISHED_STATUSES = ("succeeded", "failed")
+
+finished_jobs = Counter(
+    "jobs_finished_total", "Background jobs finished by type and status", ("type", "status")
+)
+
+JobHandler = Callable[[int, dict], Awaitable[dict]]
+# Queued jobs run lowest priority first, in submission order within a priority
+DEFAULT_JOB_PRIORITY = 0
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on a fixed pool of asyncio workers.
+    Job types have a priority, so speculative work never delays jobs a user
+    is waiting for. Jobs are recorded in the jobs table before they are queued, so callers can
+    poll them from any replica. A running job is leased to this process and
+    the lease is renewed while it runs; jobs whose lease expired are picked up
+    again by any replica.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._handlers: dict[str, JobHandler] = {}
+        self._priorities: dict[str, int] = {}
+        self._queue: asyncio.PriorityQueue[tuple[int, int, str]] | None = None
+        self._sequence = 0
+        # Ids in the local queue, so the sweep only adds jobs it doesn't hold
+        self._queued_ids: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        # job id -> queues of subscribers waiting for status changes
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+        self._submits = SingleFlight()
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def register(
+        self, job_type: str, handler: JobHandler, priority: int = DEFAULT_JOB_PRIORITY
+    ):
+        self._handlers[job_type] = handler
+        self._priorities[job_type] = priority
+
+    async def start(self):
+        """Start the workers and queue jobs left over by stopped processes."""
+        self._queue = asyncio.PriorityQueue()
+        self._queued_ids = set()
+        await self._sweep()
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))
+        ]
+        self._tasks.append(asyncio.create_task(self._sweep_periodically()))
+
+    async def stop(self):
+        # Running jobs stay 'running' in the table until their lease expires
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job_type: str, session_id: int, payload: dict):
+        """
+        Record a job and queue it for the workers.
+        A job of the same type, session and payload that is still queued or
+        running is returned instead of starting a duplicate.
+        Args:
+            job_type (str): A registered job type, e.g. 'generate' or 'grade'.
+            session_id (int): The session the job belongs to.
+            payload (dict): JSON-serializable arguments for the handler.
+        Returns:
+            models.Job: The queued or already active job row.
+        """
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        key = (job_type, session_id, json.dumps(payload, sort_keys=True))
+        return await self._submits.do(
+            key, lambda: self._submit(job_type, session_id, payload)
+        )
+
+    async def _submit(self, job_type: str, session_id: int, payload: dict):
+        assert self._queue is not None
+        job = await find_active_job(job_type, session_id, payload)
+        if job is not None:
+            return job
+        job = await create_job(uuid.uuid4().hex, job_type, session_id, payload)
+        self._put(job_type, str(job.id))
+        return job
+
+    def _put(self, job_type: str, job_id: str):
+        assert self._queue is not None
+        self._sequence += 1
+        self._queued_ids.add(job_id)
+        priority = self._priorities.get(job_type, DEFAULT_JOB_PRIORITY)
+        self._queue.put_nowait((priority, self._sequence, job_id))
+
+    async def subscribe(self, job_id: str, timeout: float) -> AsyncIterator:
+        """
+        Yield the job each time its status changes, until it finishes or
+        the timeout expires. The current state is always yielded first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, set()).add(listener)
+        try:
+            last_status = None
+            while True:
+                job = await get_job(job_id)
+                if job is None:
+                    return
+                if job.status != last_status:
+                    last_status = job.status
+                    yield job
+                remaining = deadline - loop.time()
+                if job.status in FINISHED_STATUSES or remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(
+                        listener.get(), min(remaining, JOB_POLL_INTERVAL_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listeners = self._listeners.get(job_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[job_id]
+
+    async def wait(self, job_id: str, timeout: float):
+        """Return the job once finished, or its latest state after the timeout."""
+        job = None
+        async for job in self.subscribe(job_id, timeout):
+            pass
+        return job
+
+    def _notify(self, job_id: str):
+        for listener in self._listeners.get(job_id, ()):
+            listener.put_nowait(job_id)
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._queued_ids.discard(job_id)
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                if _stopping():
+                    raise
+                # Cancelled inside the job, not by stop(); keep the worker
+                background_errors.inc(("job_worker",))
+                logger.error("Job worker error for %s: cancelled", job_id)
+            except Exception as e:
+                background_errors.inc(("job_worker",))
+                logger.exception("Job worker error for %s: %s", job_id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        if not await claim_job(job_id, self.worker_id, _lease_expiry()):
+            return
+        self._notify(job_id)
+        job = await get_job(job_id)
+        if job is None:
+            return
+        handler = self._handlers[str(job.type)]
+        heartbeat = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            result = await handler(int(job.session_id), dict(job.payload or {}))
+        except asyncio.CancelledError:
+            if _stopping():
+                # Left running, the job is requeued once its lease expires
+                raise
+            status, result, error = "failed", None, "Job was cancelled"
+        except Exception as e:
+            status, result, error = "failed", None, str(e)
+        else:
+            status, error = "succeeded", None
+        finally:
+            heartbeat.cancel()
+        if await finish_job(job_id, self.worker_id, status, result=result, error=error):
+            finished_jobs.inc((str(job.type), status))
+        else:
+            # The lease expired and another worker took the job over
+            logger.warning("Job %s finished after losing its lease, result dropped", job_id)
+        self._notify(job_id)
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                if not await renew_job_lease(job_id, self.worker_id, _lease_expiry()):
+                    return
+            except Exception as e:
+                background_errors.inc(("job_lease",))
+                logger.warning("Job lease renewal error for %s: %s", job_id, e)
+
+    async def _sweep(self):
+        """
+        Queue the jobs of replicas that died: running jobs whose lease expired,
+        and queued jobs that only sat in a dead replica's memory. Jobs another
+        live replica also queued are harmless, claim_job lets one of them run it.
+        """
+        await requeue_expired_jobs()
+        for job_id, job_type in await get_queued_jobs():
+            if job_id not in self._queued_ids:
+                self._put(job_type, job_id)
+
+    async def _sweep_periodically(self):
+        # Picks up jobs of replicas that died while this one keeps running
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+            try:
+                await self._sweep()
+            except Exception as e:
+                background_errors.inc(("job_requeue",))
+                logger.warning("Job requeue error: %s", e)
+
+
+def _lease_expiry() -> datetime.datetime:
+    return utcnow() + datetime.timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+def _stopping() -> bool:
+    """Whether the current task itself is being cancelled, e.g. by JobQueue.stop."""
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
+
+
+async def run_generate_job(
+    session_id: int,
+    payload: dict,
+    load_content: Callable[[Any], Awaitable[str]] | None = None,
+) -> dict:
+    """Generate and store the assessment for a session."""
+    assessment_type = payload["assessment_type"]
+    try:
+        generated_question = await generate_question(
+            session_id,
+            assessment_type,
+            payload.get("question_count"),
+            payload.get("explanations", False),
+            load_content,
+        )
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate question: {str(e)}")
+    if not generated_question:
+        raise RuntimeError("Failed to generate question. Please try again.")
+
+    try:
+        assessment = await create_assessment(
+            session_id=session_id,
+            user_id=payload["user_id"],
+            type_=assessment_type,
+            content=generated_question,
+        )
+    except Exception as e:
+        raise RuntimeError(f"Failed to save assessment: {str(e)}")
+    return schemas.Assessment.model_validate(assessment, from_attributes=True).model_dump(
+        mode="json"
+    )
+
+
+async def run_grade_job(session_id: int, payload: dict) -> dict:
+    """Grade the user's answers and store feedback and score."""
+    user_answer = payload["user_answer"]
+    try:
+        result = await process_assessment_feedback(session_id, user_answer=user_answer)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Failed to process feedback: {str(e)}")
+    if not result:
+        raise RuntimeError("Failed to process feedback. Please try again.")
+
+    try:
+        assessment = await update_assessment(
+            session_id=session_id,
+            answer=user_answer,
+            feedback=result.feedback,
+            score=result.score,
+        )
+    except Exception as e:
+        raise RuntimeError(f"Failed to update assessment: {str(e)}")
+    return schemas.Assessment.model_validate(assessment, from_attributes=True).model_dump(
+        mode="json"
+    )
+
+
+job_queue = JobQueue()
+job_queue.register("generate", run_generate_job)
+job_queue.register("grade", run_grade_job)
+# Speculative, so it only runs when no job a user waits for is queued
+job_queue.register("prefetch", prefetch_session, priority=1)
+
+CallbackMetric(
+    "jobs_queued",
+    "Jobs waiting for a worker in this process",
+    (),
+    lambda: {(): job_queue._queue.qsize() if job_queue._queue is not None else 0},
+)
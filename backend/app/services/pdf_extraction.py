@@ -0,0 +1,125 @@
+# PDF text extraction in a bounded process pool, off the event loop.
+# Kept free of app imports so spawned workers start quickly.
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", "2"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+PDF_EXTRACTION_TIMEOUT = float(os.getenv("PDF_EXTRACTION_TIMEOUT", "60"))
+# Extra time a worker gets to finish its current page before it is killed
+PDF_KILL_GRACE_SECONDS = 5
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def iter_pdf_pages(stream, max_pages: int, deadline: float) -> Iterator[str]:
+    """
+    Yield the text of each page, stopping at the page cap or the deadline.
+    Args:
+        stream: Binary file object holding the PDF.
+        max_pages (int): Maximum number of pages to extract.
+        deadline (float): time.monotonic() value after which extraction stops.
+    Yields:
+        str: Text of one page, empty for pages without text.
+    """
+    reader = PyPDF2.PdfReader(stream)
+    for number, page in enumerate(reader.pages):
+        if number >= max_pages:
+            logger.info("PDF page cap reached, extracted %d pages", max_pages)
+            break
+        if time.monotonic() > deadline:
+            logger.warning("PDF extraction deadline reached after %d pages", number)
+            break
+        yield page.extract_text() or ""
+
+
+def extract_pdf_file(file_path: str, max_pages: int, timeout: float) -> str:
+    """Runs in a pool worker: extracts all pages and joins them once."""
+    deadline = time.monotonic() + timeout
+    with open(file_path, "rb") as stream:
+        return "\n".join(iter_pdf_pages(stream, max_pages, deadline))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn avoids forking a process that already runs threads
+        _pool = ProcessPoolExecutor(
+            max_workers=PDF_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool(kill: bool = False):
+    """
+    Shut the worker pool down; it is recreated on the next extraction.
+    Args:
+        kill (bool): Terminate workers instead of waiting for them.
+    """
+    if _pool is not None:
+        _shutdown(_pool, kill)
+
+
+def _shutdown(pool: ProcessPoolExecutor, kill: bool):
+    global _pool
+    # Leave a pool that already replaced this one alone
+    if _pool is pool:
+        _pool = None
+    if kill:
+        # ProcessPoolExecutor has no public API to stop a running task
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=not kill, cancel_futures=True)
+
+
+async def extract_text_from_pdf_file(
+    file_path: str,
+    max_pages: int = PDF_MAX_PAGES,
+    timeout: float = PDF_EXTRACTION_TIMEOUT,
+) -> str:
+    """
+    Extract text from a PDF in the process pool.
+    Workers stop cooperatively between pages once the timeout passes; a
+    worker stuck inside a single page is killed after a short grace period.
+    Killing it breaks the shared pool, so extractions that fail with
+    BrokenProcessPool are retried once on a fresh pool.
+    Args:
+        file_path (str): Path of the stored PDF, read by the worker itself.
+        max_pages (int): Maximum number of pages to extract.
+        timeout (float): Seconds allowed for extraction.
+    Returns:
+        str: Page texts joined by newlines.
+    Raises:
+        TimeoutError: If the worker had to be killed.
+    """
+    try:
+        return await _extract_in_pool(file_path, max_pages, timeout)
+    except BrokenProcessPool as e:
+        logger.warning("PDF worker pool broke, retrying extraction once: %s", e)
+        return await _extract_in_pool(file_path, max_pages, timeout)
+
+
+async def _extract_in_pool(file_path: str, max_pages: int, timeout: float) -> str:
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    future = loop.run_in_executor(pool, extract_pdf_file, file_path, max_pages, timeout)
+    try:
+        return await asyncio.wait_for(future, timeout + PDF_KILL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        _shutdown(pool, kill=True)
+        raise TimeoutError(f"PDF extraction exceeded {timeout} seconds")
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory, or killed for another
+        # extraction's timeout), start fresh on the next upload
+        _shutdown(pool, kill=True)
+        raise
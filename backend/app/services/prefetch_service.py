@@ -0,0 +1,103 @@
+# Work started at upload time so generation and chat don't start cold
+from app.db.queries import (
+    get_assessment_by_session,
+    get_document_by_session,
+    save_assessment_draft,
+)
+from app.services.document_service import summarize_stored_document
+from app.services.generate_service import (
+    draft_settings,
+    generate_essay_prompt,
+    generate_mcq_questions,
+)
+from app.services.text_store import get_document_content
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Summarize and draft assessments after every upload; costs LLM calls for
+# assessment types the user may never pick
+PREFETCH_ON_UPLOAD = os.getenv("PREFETCH_ON_UPLOAD", "true").lower() == "true"
+PREFETCH_ASSESSMENT_TYPES = [
+    assessment_type.strip()
+    for assessment_type in os.getenv("PREFETCH_ASSESSMENT_TYPES", "essay,mcq").split(",")
+    if assessment_type.strip()
+]
+PREFETCH_MCQ_EXPLANATIONS = (
+    os.getenv("PREFETCH_MCQ_EXPLANATIONS", "false").lower() == "true"
+)
+
+
+def prefetch_payload() -> dict:
+    """Payload of the prefetch job submitted after an upload."""
+    return {
+        "assessment_types": PREFETCH_ASSESSMENT_TYPES,
+        "explanations": PREFETCH_MCQ_EXPLANATIONS,
+    }
+
+
+async def prefetch_session(session_id: int, payload: dict) -> dict:
+    """
+    Summarize a session's document and generate draft assessments ahead of
+    the user asking for them. Drafts are generated with the default settings
+    and picked up by generate_question when a request matches them.
+    A generation requested while this runs shares its in-flight LLM calls.
+    Args:
+        session_id (int): The session whose document was uploaded.
+        payload (dict): {"assessment_types": list[str], "explanations": bool}
+    Returns:
+        dict: {"prefetched": steps that succeeded, "errors": step -> error}
+    """
+    document = await get_document_by_session(session_id)
+    if document is None:
+        raise ValueError("Document not found for the given session ID")
+    content = await get_document_content(document)
+    if content.strip() == "":
+        raise ValueError("Document content is empty")
+    explanations = payload.get("explanations", False)
+
+    async def summarize():
+        if document.content_hash:
+            await summarize_stored_document(document.content_hash, content)
+
+    async def draft(assessment_type: str):
+        if assessment_type == "essay":
+            generated = await generate_essay_prompt(content)
+        elif assessment_type == "mcq":
+            generated = await generate_mcq_questions(content, None, explanations)
+        else:
+            raise ValueError("Unknown generation type. Use 'essay' or 'mcq'.")
+        # Too late if the user generated in the meantime
+        if await get_assessment_by_session(session_id) is not None:
+            return
+        await save_assessment_draft(
+            session_id,
+            assessment_type,
+            draft_settings(assessment_type, None, explanations),
+            generated,
+        )
+
+    steps = ["summary", *payload.get("assessment_types", [])]
+    results = await asyncio.gather(
+        summarize(),
+        *(draft(assessment_type) for assessment_type in steps[1:]),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, asyncio.CancelledError):
+            raise result
+    errors = {
+        step: str(result)
+        for step, result in zip(steps, results)
+        if isinstance(result, BaseException)
+    }
+    if len(errors) == len(steps):
+        raise RuntimeError(f"Failed to prefetch: {errors}")
+    for step, error in errors.items():
+        logger.warning("Prefetch %s error for session %s: %s", step, session_id, error)
+    return {
+        "prefetched": [step for step in steps if step not in errors],
+        "errors": errors,
+    }
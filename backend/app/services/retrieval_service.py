@@ -0,0 +1,170 @@
+# Local BM25 retrieval over document passages, so prompts carry only relevant text
+from collections import OrderedDict
+from app.db.queries import get_document_index, save_document_index
+from app.services.chunking import chunk_text
+from app.services.text_store import get_document_content
+import asyncio
+import math
+import numpy as np
+import os
+import re
+
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "300"))
+RETRIEVAL_CHUNK_OVERLAP_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP_TOKENS", "50"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# Number of loaded indexes kept in memory
+INDEX_CACHE_SIZE = 64
+
+STOPWORDS = frozenset(
+    """a an and are as at be but by for from has have he her his how i if in into is
+    it its me my not of on or our she so that the their them there these they this
+    to was we were what when where which who why will with you your""".split()
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of passages.
+    Postings are stored sparsely, so scoring a query only touches the
+    passages containing at least one of its terms.
+    """
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, chunks: list[str], postings: dict[str, list[list[int]]]):
+        self.chunks = chunks
+        self.postings = postings
+        self.doc_lens = np.zeros(len(chunks), dtype=np.float32)
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, (indexes, freqs) in postings.items():
+            self.doc_lens[indexes] += freqs
+        self.avg_doc_len = float(self.doc_lens.mean()) if len(chunks) else 0.0
+
+    @classmethod
+    def build(cls, text: str) -> "BM25Index":
+        """
+        Chunk text and build the postings for it.
+        Args:
+            text (str): Cleaned document text
+        Returns:
+            BM25Index: The index over the document passages
+        """
+        chunks = chunk_text(text, RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_CHUNK_OVERLAP_TOKENS)
+        postings: dict[str, list[list[int]]] = {}
+        for i, chunk in enumerate(chunks):
+            counts: dict[str, int] = {}
+            for token in tokenize(chunk):
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                posting = postings.setdefault(token, [[], []])
+                posting[0].append(i)
+                posting[1].append(count)
+        return cls(chunks, postings)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> list[str]:
+        """
+        Return the k passages most relevant to the query, in document order.
+        Falls back to the leading passages when no query term matches.
+        """
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            indexes, freqs = self._term_arrays(term)
+            df = len(indexes)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (
+                1 - self.b + self.b * self.doc_lens[indexes] / max(self.avg_doc_len, 1)
+            )
+            scores[indexes] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+
+        if not scores.any():
+            return self.chunks[:k]
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [self.chunks[i] for i in sorted(top) if scores[i] > 0]
+
+    def _term_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            indexes, freqs = self.postings[term]
+            arrays = (np.asarray(indexes), np.asarray(freqs, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+
+_index_cache: OrderedDict[int, BM25Index] = OrderedDict()
+# Indexes by content hash, so re-uploads of the same file skip tokenizing
+_hash_cache: OrderedDict[str, BM25Index] = OrderedDict()
+
+
+def _remember(cache: OrderedDict, key, index: BM25Index):
+    cache[key] = index
+    cache.move_to_end(key)
+    while len(cache) > INDEX_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+async def index_document(
+    document_id: int, content: str, content_hash: str | None = None
+) -> BM25Index:
+    """
+    Build the retrieval index for a document and persist it next to the row.
+    Args:
+        document_id (int): The ID of the indexed document.
+        content (str): Cleaned document text.
+        content_hash (str | None): SHA-256 of the uploaded file, used to reuse
+            an index built for an identical upload.
+    Returns:
+        BM25Index: The built index.
+    """
+    index = _hash_cache.get(content_hash) if content_hash else None
+    if index is None:
+        # Tokenizing a large document is CPU work, keep it off the event loop
+        index = await asyncio.to_thread(BM25Index.build, content)
+        if content_hash:
+            _remember(_hash_cache, content_hash, index)
+    await save_document_index(document_id, index.chunks, index.postings)
+    _remember(_index_cache, document_id, index)
+    return index
+
+
+async def retrieve_passages(document, query: str, k: int = RETRIEVAL_TOP_K) -> list[str]:
+    """
+    Return the top-k passages of a document for a query.
+    Indexes missing for documents uploaded before indexing existed are built
+    on first use.
+    Args:
+        document: The Document row to search.
+        query (str): Chat message, essay or other query text.
+        k (int): Number of passages to return.
+    Returns:
+        list[str]: Relevant passages in document order.
+    """
+    document_id = int(document.id)
+    index = _index_cache.get(document_id)
+    if index is None:
+        stored = await get_document_index(document_id)
+        if stored is not None:
+            index = BM25Index(stored.chunks or [], stored.postings or {})
+            _remember(_index_cache, document_id, index)
+        else:
+            index = await index_document(
+                document_id, await get_document_content(document), document.content_hash
+            )
+    else:
+        _index_cache.move_to_end(document_id)
+    return index.search(query, k)
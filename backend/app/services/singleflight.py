@@ -0,0 +1,43 @@
+# Coalesces concurrent identical calls into one execution
+from typing import Any, Awaitable, Callable
+import asyncio
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it is in
+    flight wait for the same result (or exception) instead of starting another.
+    Only concurrent calls are coalesced, results are not kept afterwards.
+    """
+
+    def __init__(self):
+        self._calls: dict[Any, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn, or wait for the call already running under key.
+        The call runs in its own task that every caller, the first one
+        included, waits for through a shield: a cancelled caller only stops
+        waiting, the call goes on for the others.
+        Args:
+            key: Hashable identity of the call.
+            fn: Coroutine function started when no call is in flight.
+        Returns:
+            The call's result, the same object for every caller.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve it here, so an exception nobody waited for isn't logged
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,109 @@
+# Compressed, content-addressed storage of extracted document text
+from app.db.queries import (
+    get_document_text,
+    get_inline_document_content,
+    save_document_text,
+)
+import asyncio
+import os
+import zlib
+
+# Characters per compressed frame; a range read only inflates the frames it overlaps
+FRAME_CHARS = 64 * 1024
+COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "6"))
+PREVIEW_CHARS = 500
+
+
+def compress_text(text: str) -> tuple[bytes, list[int]]:
+    """
+    Compress text as independent zlib frames of FRAME_CHARS characters.
+    Returns:
+        tuple[bytes, list[int]]: The concatenated frames and the size of each.
+    """
+    frames = [
+        zlib.compress(text[start : start + FRAME_CHARS].encode("utf-8"), COMPRESSION_LEVEL)
+        for start in range(0, len(text), FRAME_CHARS)
+    ]
+    return b"".join(frames), [len(frame) for frame in frames]
+
+
+def decompress_range(
+    compressed: bytes, frame_sizes: list[int], offset: int = 0, length: int | None = None
+) -> str:
+    """
+    Decompress the characters [offset, offset + length) of a compressed text.
+    Args:
+        compressed (bytes): Concatenated frames from compress_text.
+        frame_sizes (list[int]): Size of each frame.
+        offset (int): First character to return.
+        length (int | None): Number of characters, None for the rest of the text.
+    Returns:
+        str: The requested characters.
+    """
+    total = len(frame_sizes) * FRAME_CHARS
+    end = total if length is None else min(offset + length, total)
+    if offset >= end:
+        return ""
+    first, last = offset // FRAME_CHARS, (end - 1) // FRAME_CHARS
+    start_byte = sum(frame_sizes[:first])
+    parts = []
+    for size in frame_sizes[first : last + 1]:
+        parts.append(zlib.decompress(compressed[start_byte : start_byte + size]).decode("utf-8"))
+        start_byte += size
+    text = "".join(parts)
+    skip = offset - first * FRAME_CHARS
+    return text[skip : skip + (end - offset)]
+
+
+async def store_text(content_hash: str, text: str):
+    """Compress and store the cleaned text of an uploaded file."""
+    # Compressing megabytes of text is CPU work, keep it off the event loop
+    compressed, frame_sizes = await asyncio.to_thread(compress_text, text)
+    await save_document_text(content_hash, compressed, frame_sizes, len(text))
+
+
+async def load_text(
+    content_hash: str, offset: int = 0, length: int | None = None
+) -> str | None:
+    """
+    Load stored text, or a character range of it.
+    Returns:
+        str | None: The text, None if nothing is stored for the hash.
+    """
+    stored = await get_document_text(content_hash)
+    if stored is None:
+        return None
+    return await asyncio.to_thread(
+        decompress_range,
+        bytes(stored.compressed),
+        list(stored.frame_sizes),
+        offset,
+        length,
+    )
+
+
+async def get_document_content(
+    document, offset: int = 0, length: int | None = None
+) -> str:
+    """
+    Text of a document, or a character range of it.
+    Documents uploaded before text was stored compressed keep it inline.
+    Args:
+        document: The Document row.
+        offset (int): First character to return.
+        length (int | None): Number of characters, None for the rest of the text.
+    Returns:
+        str: The requested text, empty if the document has none.
+    """
+    text = None
+    if document.content_hash:
+        text = await load_text(document.content_hash, offset, length)
+    if text is None:
+        inline = await get_inline_document_content(int(document.id)) or ""
+        text = inline[offset : None if length is None else offset + length]
+    return text
+
+
+def text_metadata(text: str) -> dict:
+    """Document metadata describing stored text, returned instead of the text."""
+    return {"preview": text[:PREVIEW_CHARS], "text_length": len(text)}
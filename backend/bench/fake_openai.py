@@ -0,0 +1,193 @@
+# Local stand-in for the OpenAI chat completions API, for load tests without real GPT calls
+#
+#   python -m bench.fake_openai --port 9000 --latency-ms 800 --error-rate 0.02
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.ai.offline import SchemaFaker, fake_text, message_seed
+
+
+@dataclass
+class FakeSettings:
+    """
+    Latency and failure behaviour of the fake API.
+    Args:
+        latency_ms (float): Median time to the first token (or the whole response).
+        latency_distribution (str): 'fixed', 'uniform' (0..2x median) or
+            'lognormal' (long tail, like the real API).
+        latency_sigma (float): Spread of the lognormal distribution.
+        token_ms (float): Extra time per completion token; streams pace their chunks by it.
+        error_rate (float): Fraction of requests answered with error_status.
+        error_status (int): Status of injected errors, e.g. 429 or 503.
+        retry_after (float | None): Retry-After header sent with injected errors.
+        items (int): Length of every generated JSON array.
+    """
+
+    latency_ms: float = 500.0
+    latency_distribution: str = "lognormal"
+    latency_sigma: float = 0.5
+    token_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    retry_after: float | None = None
+    items: int = 3
+
+    def latency(self, rng: random.Random) -> float:
+        median = self.latency_ms / 1000
+        if self.latency_distribution == "fixed":
+            return median
+        if self.latency_distribution == "uniform":
+            return rng.uniform(0, 2 * median)
+        return rng.lognormvariate(0, self.latency_sigma) * median
+
+
+def _usage(messages: list[dict], completion: str) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    completion_tokens = len(completion) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def create_app(settings: FakeSettings) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    stats = {"requests": 0, "errors": 0}
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        seed = message_seed(body.get("messages", []))
+        rng = random.Random(f"{seed}:{stats['requests']}")
+        stats["requests"] += 1
+
+        await asyncio.sleep(settings.latency(rng))
+        if rng.random() < settings.error_rate:
+            stats["errors"] += 1
+            headers = {}
+            if settings.retry_after is not None:
+                headers["retry-after"] = str(settings.retry_after)
+            return JSONResponse(
+                {
+                    "error": {
+                        "message": "Injected error from the fake API",
+                        "type": "fake_error",
+                        "code": "rate_limit_exceeded"
+                        if settings.error_status == 429
+                        else None,
+                    }
+                },
+                status_code=settings.error_status,
+                headers=headers,
+            )
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            content = json.dumps(SchemaFaker(schema, seed, settings.items).make(schema))
+        else:
+            content = fake_text(seed)
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4.1")
+        usage = _usage(body.get("messages", []), content)
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream(settings, completion_id, created, model, content, usage, body),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(settings.token_ms / 1000 * usage["completion_tokens"])
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                }
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+async def _stream(settings, completion_id, created, model, content, usage, body):
+    def chunk(choices, chunk_usage=None):
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": choices,
+            "usage": chunk_usage,
+        }
+        return f"data: {json.dumps(data)}\n\n"
+
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        delta = word if i == 0 else f" {word}"
+        yield chunk([{"index": 0, "delta": {"content": delta}, "finish_reason": None}])
+        if settings.token_ms:
+            await asyncio.sleep(settings.token_ms / 1000)
+    yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield chunk([], usage)
+    yield "data: [DONE]\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("fixed", "uniform", "lognormal"),
+        default="lognormal",
+    )
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    settings = FakeSettings(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        latency_sigma=args.latency_sigma,
+        token_ms=args.token_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        items=args.items,
+    )
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# End-to-end load test: concurrent upload -> generate -> grade -> chat flows against a running backend
+#
+#   python -m bench.load_test --base-url http://localhost:8000 --users 20 --flows 200
+#   python -m bench.load_test --json results.json --baseline baseline.json
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+
+import httpx
+
+# Seconds to long-poll a job per request, the server caps it at 30
+JOB_WAIT_SECONDS = 30
+
+WORDS = (
+    "cell membrane protein energy enzyme reaction gradient transport signal "
+    "molecule structure function process system pathway receptor synthesis "
+    "layer charge balance cycle storage release control network response"
+).split()
+
+
+class LatencyStats:
+    """Collects latencies and errors per flow step."""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.requests = 0
+
+    def record(self, step: str, seconds: float):
+        self.latencies.setdefault(step, []).append(seconds)
+
+    def record_error(self, step: str):
+        self.errors[step] = self.errors.get(step, 0) + 1
+
+    def summary(self, wall_seconds: float) -> dict:
+        steps = {}
+        for step in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(step, []))
+            steps[step] = {
+                "count": len(values),
+                "errors": self.errors.get(step, 0),
+                "mean_ms": 1000 * sum(values) / len(values) if values else None,
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "p99_ms": _percentile(values, 99),
+            }
+        return {
+            "wall_seconds": wall_seconds,
+            "requests": self.requests,
+            "requests_per_second": self.requests / wall_seconds if wall_seconds else 0.0,
+            "steps": steps,
+        }
+
+
+def _percentile(values: list[float], percent: float) -> float | None:
+    """Nearest-rank percentile of sorted values, in milliseconds."""
+    if not values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return 1000 * values[rank - 1]
+
+
+def make_document(seed: int, paragraphs: int) -> bytes:
+    """A deterministic plain-text document; each seed gives different text."""
+    rng = random.Random(seed)
+    text = []
+    for p in range(paragraphs):
+        sentences = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+            for _ in range(rng.randint(4, 8))
+        ]
+        text.append(f"Section {p + 1}. " + " ".join(sentences))
+    return "\n\n".join(text).encode("utf-8")
+
+
+class Flow:
+    """One simulated student: upload, generate, answer, grade and chat."""
+
+    def __init__(self, client: httpx.AsyncClient, stats: LatencyStats, args, index: int):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.index = index
+        self.user_id = 1 + index % args.user_ids
+
+    async def request(self, step: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        self.stats.requests += 1
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.stats.record_error(step)
+            raise
+        self.stats.record(step, time.perf_counter() - start)
+        return response
+
+    async def run_job(self, step: str, url: str, body: dict) -> dict:
+        """Submit a job and wait for its result; the step covers both."""
+        start = time.perf_counter()
+        job = (await self.request(f"{step}_submit", "POST", url, json=body)).json()
+        while job["status"] not in ("succeeded", "failed"):
+            job = (
+                await self.request(
+                    "job_poll",
+                    "GET",
+                    f"/jobs/{job['id']}",
+                    params={"wait": JOB_WAIT_SECONDS},
+                )
+            ).json()
+        if job["status"] != "succeeded":
+            self.stats.record_error(step)
+            raise RuntimeError(f"{step} job failed: {job.get('error')}")
+        self.stats.record(step, time.perf_counter() - start)
+        return job["result"]
+
+    async def run(self):
+        session = (
+            await self.request("new_session", "POST", f"/new_session/{self.user_id}")
+        ).json()
+        session_id = session["id"]
+
+        # Reusing seeds makes documents repeat, which exercises the caches
+        seed = self.index % self.args.unique_documents
+        await self.request(
+            "upload",
+            "POST",
+            f"/upload/{session_id}",
+            files={
+                "file": (
+                    f"doc-{seed}.txt",
+                    make_document(seed, self.args.paragraphs),
+                    "text/plain",
+                )
+            },
+        )
+
+        assessment_type = self.args.assessment
+        if assessment_type == "mixed":
+            assessment_type = "mcq" if self.index % 2 else "essay"
+        assessment = await self.run_job(
+            f"generate_{assessment_type}",
+            f"/generate/{session_id}",
+            {
+                "user_id": self.user_id,
+                "assessment_type": assessment_type,
+                "question_count": self.args.question_count,
+            },
+        )
+
+        if assessment_type == "mcq":
+            rng = random.Random(self.index)
+            answers = [
+                rng.choice([q["correct_answer"], *q["distractors"]])
+                for q in assessment["content"]["questions"]
+            ]
+        else:
+            answers = [make_document(self.index, 1).decode("utf-8")]
+        await self.run_job(
+            f"grade_{assessment_type}", f"/grade/{session_id}", {"user_answer": answers}
+        )
+
+        for turn in range(self.args.chat_turns):
+            await self.request(
+                "chat",
+                "POST",
+                f"/chat/{session_id}",
+                json={
+                    "user_id": self.user_id,
+                    "message": f"Can you explain question {turn + 1} again?",
+                    "document_content": "",
+                    "assessment": None,
+                },
+            )
+
+        await self.request("load_session", "GET", f"/session/{session_id}")
+
+
+async def run_load(args) -> dict:
+    stats = LatencyStats()
+    semaphore = asyncio.Semaphore(args.users)
+    failed_flows = 0
+
+    async def run_flow(index: int):
+        nonlocal failed_flows
+        async with semaphore:
+            try:
+                await Flow(client, stats, args, index).run()
+            except Exception as e:
+                failed_flows += 1
+                if args.verbose:
+                    print(f"Flow {index} failed: {e}", file=sys.stderr)
+
+    limits = httpx.Limits(max_connections=args.users * 2)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_flow(i) for i in range(args.flows)))
+        wall_seconds = time.perf_counter() - start
+
+    summary = stats.summary(wall_seconds)
+    summary["flows"] = args.flows
+    summary["failed_flows"] = failed_flows
+    summary["flows_per_second"] = args.flows / wall_seconds if wall_seconds else 0.0
+    return summary
+
+
+def print_summary(summary: dict):
+    def ms(value):
+        return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"{'step':<22}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for step, s in summary["steps"].items():
+        print(
+            f"{step:<22}{s['count']:>7}{s['errors']:>8}"
+            f"{ms(s['p50_ms'])}{ms(s['p95_ms'])}{ms(s['p99_ms'])}"
+        )
+    print(
+        f"\n{summary['flows']} flows ({summary['failed_flows']} failed) in "
+        f"{summary['wall_seconds']:.1f}s: {summary['requests_per_second']:.1f} req/s, "
+        f"{summary['flows_per_second']:.2f} flows/s"
+    )
+
+
+def compare(summary: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Steps whose p95 grew by more than max_regression over the baseline."""
+    regressions = []
+    for step, s in summary["steps"].items():
+        before = baseline.get("steps", {}).get(step, {}).get("p95_ms")
+        after = s["p95_ms"]
+        if before and after and after > before * (1 + max_regression):
+            regressions.append(f"{step}: p95 {before:.1f} ms -> {after:.1f} ms")
+    before_rps = baseline.get("requests_per_second")
+    if before_rps and summary["requests_per_second"] < before_rps * (1 - max_regression):
+        regressions.append(
+            f"throughput: {before_rps:.1f} -> {summary['requests_per_second']:.1f} req/s"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the backend")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent flows")
+    parser.add_argument("--flows", type=int, default=50, help="Flows in total")
+    parser.add_argument("--user-ids", type=int, default=10)
+    parser.add_argument(
+        "--assessment", choices=("essay", "mcq", "mixed"), default="mixed"
+    )
+    parser.add_argument("--question-count", type=int, default=5)
+    parser.add_argument("--chat-turns", type=int, default=3)
+    parser.add_argument("--paragraphs", type=int, default=20)
+    parser.add_argument("--unique-documents", type=int, default=1_000_000)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Fail on regressions against these results")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args))
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+    if summary["failed_flows"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -110,7 +110,7 @@ const App: React.FC = () => {
     ]);
     setIsChatSending(true);
     try {
-      const response = await api.chatWithBot(sessionId, userId, chatInput, document ? document.content : "", assessment);
+      const response = await api.chatWithBot(sessionId, userId, chatInput, "", assessment);
       if (response.response) {
         setChatMessages((msgs) => [
           ...msgs,
@@ -1,6 +1,29 @@
 import type { Document, Assessment, AssessmentType, PracticeSessions, SelectedSession, ChatResponse } from '../types';
 const API_BASE_URL = import.meta.env.API_BASE_URL || 'http://localhost:8000';
 
+interface Job<T> {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  result?: T;
+  error?: string;
+}
+
+// Long-poll a background job until it finishes and return its result
+async function waitForJob<T>(job: Job<T>): Promise<T> {
+  while (job.status !== 'succeeded' && job.status !== 'failed') {
+    const response = await fetch(`${API_BASE_URL}/jobs/${job.id}?wait=25`);
+    if (!response.ok) {
+      throw new Error(`Failed to get job status: ${response.statusText}`);
+    }
+    job = await response.json();
+  }
+
+  if (job.status === 'failed' || job.result === undefined) {
+    throw new Error(job.error || 'Job failed');
+  }
+  return job.result;
+}
+
 
 export const api = {
   async uploadDocument(file: File, sessionId: number): Promise<Document> {
@@ -34,7 +57,7 @@ export const api = {
       throw new Error(`Failed to generate task: ${response.statusText}`);
     }
 
-    return response.json();
+    return waitForJob<Assessment>(await response.json());
   },
 
   async getFeedback(sessionId: number, userAnswer: Array<string>): Promise<Assessment> {
@@ -52,7 +75,7 @@ export const api = {
       throw new Error(`Failed to get feedback: ${response.statusText}`);
     }
 
-    return response.json();
+    return waitForJob<Assessment>(await response.json());
   },
 
   async createSession(): Promise<number> {
@@ -12,6 +12,8 @@ export interface MCQQuestion {
     question: string;
     correct_answer: string;
     distractors: string[];
+    explanation?: string;
+    distractor_explanations?: Record<string, string>;
 }
 
 export interface MCQContent {
@@ -49,7 +51,8 @@ export interface Document {
     session_id: number;
     filename: string;
     path: string;
-    content: string;
+    preview?: string | null;
+    text_length?: number | null;
     doc_metadata: {
         content_type: string;
         size: number;
@@ -66,6 +69,7 @@ export interface PracticeSession {
 
 export interface PracticeSessions {
     sessions: PracticeSession[];
+    next_cursor?: string | null;
 }
 
 export interface SelectedSession {
@@ -73,6 +77,7 @@ export interface SelectedSession {
     document: Document | null;
     assessment: Assessment | null;
     chat_messages: ChatMessage[];
+    messages_cursor?: string | null;
 }
 
 // Component Props Interfaces